@@ -1,281 +1,217 @@
 # -*- coding: utf-8 -*-
 
 # Generic BBST Node structure
-class Node:
-    def __init__(self, value, relation_function):
+class Node(object):
+    __slots__ = ('value', 'left_son', 'right_son', 'parent', 'height')
+
+    def __init__(self, value):
         self.value = value
         self.left_son = None
         self.right_son = None
         self.parent = None
         self.height = 1
-        self.total_order_relation = relation_function
 
     def is_right_child(self):
-        return self.parent.right_son == self
+        return self.parent is not None and self.parent.right_son is self
 
     def is_left_child(self):
-        return self.parent.left_son == self
+        return self.parent is not None and self.parent.left_son is self
 
     def update_height(self):
         left_height = 0 if self.left_son is None else self.left_son.height
         right_height = 0 if self.right_son is None else self.right_son.height
-        self.height = 1 + max(left_height, right_height)
+        self.height = 1 + (left_height if left_height > right_height else right_height)
 
     def get_balance(self):
         left_height = 0 if self.left_son is None else self.left_son.height
         right_height = 0 if self.right_son is None else self.right_son.height
         return left_height - right_height
 
-    def lesser_than(self, node):
-        return self.total_order_relation(self.value, node.value) == -1
-
-    def greater_than(self, node):
-        return self.total_order_relation(self.value, node.value) == 1
 
-    def equal(self, node):
-        return not(self.greater_than(node) or self.lesser_than(node))
-
-# Generic BBST structure
-class BalancedBinarySearchTree:
+# Generic BBST structure (AVL). Every operation is iterative and the leftmost
+# node is cached, so min() does not walk the left spine.
+class BalancedBinarySearchTree(object):
     def __init__(self, function):
         self.root = None
+        self.leftmost = None
         self.comparison_function = function
 
     def contains(self, value):
-        node = self.__get(self.__create_node(value), self.root)
-        if node is None: return False
-        else: return True
-
-    def __create_node(self, value):
-        return Node(value, self.comparison_function)
-
-    def __get(self, node, root):
-        if root is None: return None
-
-        if node.lesser_than(root):
-            return self.__get(node, root.left_son)
-        elif node.greater_than(root):
-            return self.__get(node, root.right_son)
-        else:
-            return root
+        return self.__get(value) is not None
+
+    def __get(self, value):
+        compare = self.comparison_function
+        node = self.root
+        while node is not None:
+            relation = compare(value, node.value)
+            if relation == -1: node = node.left_son
+            elif relation == 1: node = node.right_son
+            else: return node
+        return None
 
     def insert(self, value):
-        new_node = self.__create_node(value)
+        new_node = Node(value)
         if self.root is None:
             self.root = new_node
-            self.root.parent = self.root
-        else: self.__insert(self.root, new_node)
+            self.leftmost = new_node
+            return
+
+        compare = self.comparison_function
+        node = self.root
+        leftmost = True
+        while True:
+            if compare(value, node.value) == -1:
+                if node.left_son is None:
+                    node.left_son = new_node
+                    break
+                node = node.left_son
+            else:
+                leftmost = False
+                if node.right_son is None:
+                    node.right_son = new_node
+                    break
+                node = node.right_son
+        new_node.parent = node
+        if leftmost: self.leftmost = new_node
+
+        while node is not None:
+            old_height = node.height
+            node = self.__rebalance(node)
+            if node.height == old_height: break
+            node = node.parent
 
     def remove(self, value):
-        node = self.__get(self.__create_node(value), self.root)
+        node = self.__get(value)
+        if node is None: return
+
         if not(node.left_son is None or node.right_son is None):
-            successor = BalancedBinarySearchTree.__min_node(node.right_son)
+            successor = node.right_son
+            while successor.left_son is not None:
+                successor = successor.left_son
             node.value = successor.value
             node = successor
 
-        if node.left_son and (not node.right_son):
-            if self.root == node:
-                node.left_son.parent = node.left_son
-                self.root = node.left_son
-            else:
-                node.left_son.parent = node.parent
-                if node.is_left_child():
-                    node.parent.left_son = node.left_son
-                else:
-                    node.parent.right_son = node.left_son
-                self.__balance_tree_after_deletion(node.parent)
-
-        elif node.right_son and (not node.left_son):
-            if self.root == node:
-                node.right_son.parent = node.right_son
-                self.root = node.right_son
-            else:
-                node.right_son.parent = node.parent
-                if node.is_right_child():
-                    node.parent.right_son = node.right_son
-                else:
-                    node.parent.left_son = node.right_son
-                self.__balance_tree_after_deletion(node.parent)
-
-        else:
-            if self.root == node:
-                self.root = None
-            else:
-                if node.is_left_child():
-                    node.parent.left_son = None
-                else:
-                    node.parent.right_son = None
-                self.__balance_tree_after_deletion(node.parent)
+        child = node.left_son if node.left_son is not None else node.right_son
+        parent = node.parent
+        if child is not None: child.parent = parent
+        if parent is None: self.root = child
+        elif parent.left_son is node: parent.left_son = child
+        else: parent.right_son = child
+
+        if self.leftmost is node:
+            self.leftmost = child if child is not None else parent
+
+        node = parent
+        while node is not None:
+            old_height = node.height
+            node = self.__rebalance(node)
+            if node.height == old_height: break
+            node = node.parent
+
+    # Replaces the contents of the tree by values, which must already be sorted
+    # according to the comparison function. Runs in linear time.
+    def load_sorted(self, values):
+        nodes = [Node(value) for value in values]
+        self.root = None
+        self.leftmost = nodes[0] if nodes else None
+
+        stack = [(0, len(nodes), None, False)]
+        while stack:
+            low, high, parent, is_right = stack.pop()
+            if low >= high: continue
+            middle = (low + high) // 2
+            node = nodes[middle]
+            node.height = (high - low).bit_length()
+            node.parent = parent
+            if parent is None: self.root = node
+            elif is_right: parent.right_son = node
+            else: parent.left_son = node
+            stack.append((low, middle, node, False))
+            stack.append((middle + 1, high, node, True))
 
     def min(self):
-        min_node = BalancedBinarySearchTree.__min_node(self.root)
-        return None if min_node is None else min_node.value
-
-    @staticmethod
-    def __min_node(root):
-        if root is None or root.left_son is None:
-            return root
-        else:
-            return BalancedBinarySearchTree.__min_node(root.left_son)
-
-    def __insert(self, node, new_node):
-        if new_node.lesser_than(node):
-            if node.left_son:
-                self.__insert(node.left_son, new_node)
-            else:
-                node.left_son = new_node
-                node.left_son.parent = node
-                self.__balance_tree_after_insertion(node)
-        else:
-            if node.right_son:
-                self.__insert(node.right_son, new_node)
+        return None if self.leftmost is None else self.leftmost.value
+
+    # In-order traversal of the stored values
+    def values(self):
+        stack = []
+        node = self.root
+        while stack or node is not None:
+            if node is not None:
+                stack.append(node)
+                node = node.left_son
             else:
-                node.right_son = new_node
-                node.right_son.parent = node
-                self.__balance_tree_after_insertion(node)
+                node = stack.pop()
+                yield node.value
+                node = node.right_son
 
-    def __balance_tree_after_insertion(self, node):
+    # Restores the AVL condition at node and returns the root of its subtree
+    def __rebalance(self, node):
         node.update_height()
-        if node.get_balance() == 1 or node.get_balance() == -1:
-            if self.root != node:
-                self.__balance_tree_after_insertion(node.parent)
-        elif node.get_balance() == 2:
-            if node.left_son.get_balance() == 1:
-                self.__rotate_right(node)
-            else: self.__rotate_left_right(node)
-        elif node.get_balance() == -2:
-            if node.right_son.get_balance() == -1:
-                self.__rotate_left(node)
-            else: self.__rotate_right_left(node)
-
-    def __balance_tree_after_deletion(self, node):
-        node.update_height()
-        parent = node.parent
-
-        if node.get_balance() == 2:
+        balance = node.get_balance()
+        if balance == 2:
             if node.left_son.get_balance() == -1:
-                self.__rotate_left_right(node)
-            else: self.__rotate_right(node)
-        if node.get_balance() == -2:
+                self.__rotate_left(node.left_son)
+            return self.__rotate_right(node)
+        elif balance == -2:
             if node.right_son.get_balance() == 1:
-                self.__rotate_right_left(node)
-            else: self.__rotate_left(node)
+                self.__rotate_right(node.right_son)
+            return self.__rotate_left(node)
+        return node
 
-        if parent != node:
-            self.__balance_tree_after_deletion(parent)
+    def __replace_child(self, node, son):
+        parent = node.parent
+        son.parent = parent
+        if parent is None: self.root = son
+        elif parent.left_son is node: parent.left_son = son
+        else: parent.right_son = son
 
     def __rotate_right(self, node):
         son = node.left_son
         node.left_son = son.right_son
-        if son.right_son:
+        if son.right_son is not None:
             son.right_son.parent = node
-        if self.root == node:
-            son.parent = son
-            self.root = son
-        else:
-            son.parent = node.parent
-            if node.is_right_child():
-                node.parent.right_son = son
-            else: node.parent.left_son = son
+        self.__replace_child(node, son)
         son.right_son = node
         node.parent = son
         node.update_height()
         son.update_height()
+        return son
 
     def __rotate_left(self, node):
         son = node.right_son
         node.right_son = son.left_son
-        if son.left_son:
+        if son.left_son is not None:
             son.left_son.parent = node
-        if self.root == node:
-            son.parent = son
-            self.root = son
-        else:
-            son.parent = node.parent
-            if node.is_left_child():
-                node.parent.left_son = son
-            else: node.parent.right_son = son
+        self.__replace_child(node, son)
         son.left_son = node
         node.parent = son
         node.update_height()
         son.update_height()
-
-    def __rotate_left_right(self, node):
-        son = node.left_son
-        grandson = son.right_son
-        son.right_son = grandson.left_son
-        if grandson.left_son:
-            grandson.left_son.parent = son
-        node.left_son = grandson.right_son
-        if grandson.right_son:
-            grandson.right_son.parent = node
-
-        son.update_height()
-        node.update_height()
-
-        grandson.left_son = son
-        son.parent = grandson
-        if self.root == node:
-            grandson.parent = grandson
-            self.root = grandson
-        else:
-            grandson.parent = node.parent
-            if node.is_left_child():
-                node.parent.left_son = grandson
-            else: node.parent.right_son = grandson
-        grandson.right_son = node
-        node.parent = grandson
-        grandson.update_height()
-
-    def __rotate_right_left(self, node):
-        son = node.right_son
-        grandson = son.left_son
-        son.left_son = grandson.right_son
-        if grandson.right_son:
-            grandson.right_son.parent = son
-        node.right_son = grandson.left_son
-        if grandson.left_son:
-            grandson.left_son.parent = node
-
-        son.update_height()
-        node.update_height()
-
-        grandson.right_son = son
-        son.parent = grandson
-        if self.root == node:
-            grandson.parent = grandson
-            self.root = grandson
-        else:
-            grandson.parent = node.parent
-            if node.is_right_child():
-                node.parent.right_son = grandson
-            else: node.parent.left_son = grandson
-        grandson.left_son = node
-        node.parent = grandson
-        grandson.update_height()
-
+        return son
 
     def print_tree(self):
         print
-        self.__print_tree_rec(0, self.root)
+        stack = [(0, self.root)]
+        while stack:
+            tabs, node = stack.pop()
+            print ' ' * (2 * tabs),
+            if node is None:
+                print 'Nil'
+                continue
+            parent = node if node.parent is None else node.parent
+            print str(node.value) + '(' + str(parent.value) + '/' + str(node.get_balance()) + ')'
+            stack.append((tabs + 3, node.left_son))
+            stack.append((tabs + 3, node.right_son))
         print
 
-    def __print_tree_rec(self, tabs, node):
-        for i in range(0, tabs):
-            print " ",
-        if not node is None:
-            print str(node.value) + '(' + str(node.parent.value) + '/' + str(node.get_balance()) + ')'
-            self.__print_tree_rec(tabs + 3, node.right_son)
-            self.__print_tree_rec(tabs + 3, node.left_son)
-        else: print 'Nil'
-
 
 ######################################################################
 # Simple tree structure test
 
-def node_comparison_function_test(self, node):
-    if self.value < node.value: return -1
-    elif self.value > node.value: return 1
+def node_comparison_function_test(value, other_value):
+    if value < other_value: return -1
+    elif value > other_value: return 1
     else: return 0
 
 
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import os
+import hashlib
+from collections import OrderedDict
+from intervals import VisibleIntervals
+from scanline import scan_scene_intervals
+
+
+# Least recently used cache of scan results, as VisibleIntervals, keyed by the
+# fingerprint of the scene and the guard. With a grid spacing the guard is
+# snapped to the nearest grid point, and the scan is made from that point,
+# unless that point lies on a segment. Results are evicted once they take
+# more than max_bytes; with a spill directory the evicted results are written
+# there and read back on a miss.
+class ResultCache(object):
+    def __init__(self, max_bytes=64 << 20, grid=None, spill_directory=None):
+        self.max_bytes = max_bytes
+        self.grid = grid
+        self.spill_directory = spill_directory
+        self.entries = OrderedDict()
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    # The guard the scan is made from
+    def snap(self, x, y):
+        if self.grid is None: return float(x), float(y)
+        return (round(x / self.grid) * self.grid,
+                round(y / self.grid) * self.grid)
+
+    def key(self, scene, x, y):
+        guard = self.snap(x, y)
+        if guard != (x, y) and scene.touches(*guard):
+            guard = float(x), float(y)
+        return scene.fingerprint(), guard[0], guard[1]
+
+    # Same as scanline.scan_scene_intervals, served from the cache if possible
+    def scan(self, scene, x, y):
+        key = self.key(scene, x, y)
+        result = self.entries.pop(key, None)
+        if result is not None:
+            self.hits += 1
+            self.entries[key] = result
+            return result
+
+        result = self.read_spilled(key)
+        if result is not None: self.disk_hits += 1
+        else:
+            self.misses += 1
+            if scene.touches(key[1], key[2]):
+                raise Exception('Guard must not lie on a segment')
+            result = scan_scene_intervals(scene, key[1], key[2])
+        self.store(key, result)
+        return result
+
+    def store(self, key, result):
+        self.entries[key] = result
+        self.size += size_of(result)
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            old_key, old_result = self.entries.popitem(last=False)
+            self.size -= size_of(old_result)
+            self.evictions += 1
+            if self.spill_directory is not None:
+                with open(self.spill_path(old_key), 'wb') as stream:
+                    old_result.write_binary(stream)
+
+    def spill_path(self, key):
+        name = hashlib.sha1(repr(key)).hexdigest() + '.ivl'
+        return os.path.join(self.spill_directory, name)
+
+    def read_spilled(self, key):
+        if self.spill_directory is None: return None
+        path = self.spill_path(key)
+        if not os.path.exists(path): return None
+        with open(path, 'rb') as stream:
+            return VisibleIntervals.read_binary(stream)
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def statistics(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'disk_hits': self.disk_hits,
+                'entries': len(self.entries), 'bytes': self.size}
+
+
+# Bytes held by a result: its rows and the index of the segments that have
+# intervals, whatever the size of the scene
+def size_of(result):
+    return result.rows.nbytes + result.segments.nbytes + result.offsets.nbytes
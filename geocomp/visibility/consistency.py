@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Regression check of the edits of an EditableScene against fresh scans. On
+# random scenes, some of whose extremes lie on the starting ray, and on the
+# lattices of the robustness check, segments are removed and added back at
+# random; after each edit the intervals kept up to date must have the same
+# rows as a scan of the whole scene.
+#
+#   python -m geocomp.visibility.consistency
+
+import sys
+import math
+import random
+import numpy
+from editing import EditableScene
+from robustness import lattice_scene
+from scanline import scan_scene_intervals
+
+EDITS = 40
+
+
+def float_orientation(x, y, x1, y1, x2, y2):
+    return cmp((x1 - x) * (y2 - y) - (y1 - y) * (x2 - x), 0)
+
+
+def touching(s, t):
+    return (float_orientation(t[0], t[1], t[2], t[3], s[0], s[1]) *
+            float_orientation(t[0], t[1], t[2], t[3], s[2], s[3]) <= 0 and
+            float_orientation(s[0], s[1], s[2], s[3], t[0], t[1]) *
+            float_orientation(s[0], s[1], s[2], s[3], t[2], t[3]) <= 0)
+
+
+# count segments up to length long in a 20 by 20 square, none touching
+# another or the guard at its center. One extreme of some of them is moved
+# to the height of the guard.
+def random_scene(count, length, seed):
+    generator = random.Random(seed)
+    guard = (10.0, 10.0)
+    # the segments through the guard meet this cross
+    segments = [(9.0, 10.0, 11.0, 10.0), (10.0, 9.0, 10.0, 11.0)]
+    while len(segments) < count + 2:
+        x, y = generator.uniform(0, 20), generator.uniform(0, 20)
+        angle = generator.uniform(0, math.pi)
+        size = generator.uniform(0.3, length)
+        s = [x, y, x + size * math.cos(angle), y + size * math.sin(angle)]
+        if generator.random() < 0.2: s[generator.choice((1, 3))] = guard[1]
+        if not any(touching(s, t) for t in segments): segments.append(s)
+    return guard, segments[2:]
+
+
+def test_scenes():
+    scenes = [('random %d' % seed, random_scene(40, 4.0, seed))
+              for seed in range(8)]
+    scenes += [('lattice %d' % seed, lattice_scene(7, seed))
+               for seed in range(4)]
+    return scenes
+
+
+# Segments whose rows differ between the edited scene and a fresh scan
+def mismatches(edited):
+    scene, indices = edited.scene()
+    fresh = scan_scene_intervals(scene, *edited.guard)
+    fresh = fresh.renumbered(len(edited), indices)
+    return [k for k in range(len(edited))
+            if edited.intervals.of_segment(k).tobytes() !=
+            fresh.of_segment(k).tobytes()]
+
+
+# Description of the first edit of the scene after which the rows differ
+def failure(name, guard, segments, seed):
+    generator = random.Random(seed)
+    edited = EditableScene(segments, *guard)
+    removed = []
+    for edit in range(EDITS):
+        if removed and generator.random() < 0.5:
+            edited.add_segment(*removed.pop(generator.randrange(len(removed))))
+        else:
+            k = generator.choice(numpy.flatnonzero(edited.active).tolist())
+            removed.append(edited.coordinates[k].tolist())
+            edited.remove_segment(k)
+        wrong = mismatches(edited)
+        if wrong: return '%s, edit %d: segments %s' % (name, edit, wrong)
+    return None
+
+
+def main():
+    scenes = test_scenes()
+    failed = [failure(name, guard, segments, seed)
+              for seed, (name, (guard, segments)) in enumerate(scenes)]
+    failed = [f for f in failed if f is not None]
+    for f in failed: print 'FAILED', f
+    print '%d scenes, %d edits:' % (len(scenes), EDITS),
+    print 'ok' if not failed else '%d failures' % len(failed)
+    if failed: sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
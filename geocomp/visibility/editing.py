@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+import numpy
+from intervals import ANGLE_TOLERANCE
+from intervals import VisibleIntervals
+from scene import Scene
+from scanline import STARTING_RAY
+from scanline import scan_scene_intervals
+from scanline import scan_scene_sector
+from spatial import angular_spans
+
+
+# Angle by which the sector swept again on an edit reaches past the rays of the
+# extremes of the edited segment, on each side, so that what is seen along
+# those rays, or along the single ray of a segment seen edge on, is swept again
+SECTOR_MARGIN = 5e-10
+
+
+# A scene whose segments can be added and removed, with the visibility from
+# a fixed guard kept up to date. Segments keep their indices: a removed
+# segment is left without intervals. An edit sweeps again only the sector
+# along which the guard sees the edited segment; the intervals outside that
+# sector are kept and spliced with the new ones.
+class EditableScene(object):
+    def __init__(self, coordinates, x, y):
+        self.guard = (float(x), float(y))
+        self.coordinates = numpy.array(coordinates, dtype=float).reshape(-1, 4)
+        self.active = numpy.ones(len(self.coordinates), dtype=bool)
+        self.intervals = scan_scene_intervals(Scene(self.coordinates), x, y)
+
+    def __len__(self):
+        return len(self.coordinates)
+
+    # Adds the segment from (x0, y0) to (x1, y1) and returns its index
+    def add_segment(self, x0, y0, x1, y1):
+        self.coordinates = numpy.vstack((self.coordinates, [(x0, y0, x1, y1)]))
+        self.active = numpy.append(self.active, True)
+        k = len(self.coordinates) - 1
+        self.update(k)
+        return k
+
+    def remove_segment(self, k):
+        if not self.active[k]: raise Exception('Segment already removed')
+        self.active[k] = False
+        self.update(k)
+
+    # The segments in use, as a Scene, along with their indices
+    def scene(self):
+        indices = numpy.flatnonzero(self.active)
+        return Scene(self.coordinates[indices]), indices
+
+    def update(self, k):
+        x, y = self.guard
+        low, width = angular_spans(self.coordinates[k:k + 1], x, y)
+        low = float(low[0]) - SECTOR_MARGIN
+        width = float(width[0]) + 2 * SECTOR_MARGIN
+
+        scene, indices = self.scene()
+        inside = scan_scene_sector(scene, x, y, low, low + width)
+        inside = inside.renumbered(len(self), indices)
+        outside = self.intervals.within_sector(self.guard, low + width,
+                                               2 * numpy.pi - width,
+                                               self.coordinates)
+        rows = numpy.concatenate((outside.rows, inside.rows))
+        point = rows['start_angle'] == rows['end_angle']
+        lines = rows[~point]
+        lines = lines[numpy.lexsort((sweep_angles(lines), lines['segment']))]
+        boundaries = numpy.mod([low, low + width], 2 * numpy.pi)
+        lines, wraps = join_around(lines, boundaries)
+
+        segment = lines['segment']
+        start = numpy.column_stack((lines['start_x'], lines['start_y']))
+        end = numpy.column_stack((lines['end_x'], lines['end_y']))
+        if wraps.any():
+            # an interval joined across the starting ray is cut there again,
+            # at the point where a scan cuts it
+            crossing = segment[wraps]
+            view = Scene(self.coordinates[crossing]).view(x, y)
+            hits = numpy.column_stack(view.event_coordinates(
+                numpy.arange(len(crossing)),
+                numpy.repeat(STARTING_RAY, len(crossing))))
+            segment = numpy.concatenate((segment, crossing))
+            start = numpy.concatenate((start, hits))
+            end = numpy.concatenate((end, end[wraps]))
+            end[numpy.flatnonzero(wraps)] = hits
+        lines = VisibleIntervals.from_arrays(len(self), self.guard, segment,
+                                             start, end).rows
+
+        rows = numpy.concatenate((lines, rows[point]))
+        rows = rows[numpy.lexsort((-rows['end_angle'], sweep_angles(rows),
+                                   rows['segment']))]
+        self.intervals = VisibleIntervals(len(self), rows)
+
+
+# Polar angles of the rays on which a scan finds the intervals: an interval
+# that starts on the starting ray is found first, even where its start angle
+# rounds to 2pi, and a single point seen along it is found last
+def sweep_angles(rows):
+    angles = rows['start_angle'].copy()
+    point = rows['start_angle'] == rows['end_angle']
+    angles[~point & (angles > 2 * numpy.pi - ANGLE_TOLERANCE)] = 0
+    angles[point & (rows['end_angle'] == 0)] = 2 * numpy.pi
+    return angles
+
+
+# Joins the rows of one segment that meet on one of the rays with the given
+# polar angles, where the intervals were cut. The rows are grouped by segment
+# and sorted by sweep_angles; the last row of a segment meets the first one
+# across the starting ray, as 2pi and 0 are the same angle. Each run of joined
+# rows becomes its first row, ending where the run ends, and is flagged where
+# it wraps around the starting ray.
+def join_around(rows, angles, tolerance=1e-9):
+    index = numpy.arange(len(rows))
+    segment = rows['segment']
+    first = numpy.ones(len(rows), dtype=bool)
+    first[1:] = segment[1:] != segment[:-1]
+    last = numpy.append(first[1:], True)
+    group = numpy.cumsum(first) - 1
+    following = numpy.where(last, numpy.flatnonzero(first)[group], index + 1)
+
+    end = numpy.column_stack((rows['end_x'], rows['end_y']))
+    start = numpy.column_stack((rows['start_x'], rows['start_y']))[following]
+    meeting = numpy.mod(rows['end_angle'], 2 * numpy.pi)
+    cut = numpy.zeros(len(rows), dtype=bool)
+    for angle in angles:
+        gap = numpy.abs(meeting - angle)
+        cut |= numpy.minimum(gap, 2 * numpy.pi - gap) <= tolerance
+    scale = numpy.maximum(numpy.abs(end).max(axis=1), 1.0)
+    joined = cut & (following != index) & \
+             (numpy.abs(end - start).max(axis=1) <= tolerance * scale)
+
+    # a run starts at a row the one before does not join, and ends before the
+    # next run of its segment, going around
+    preceding = numpy.empty_like(index)
+    preceding[following] = index
+    heads = numpy.flatnonzero(~joined[preceding])
+    head_group = group[heads]
+    next_head = numpy.append(heads[1:], 0)
+    same = numpy.append(head_group[1:] == head_group[:-1], False)
+    next_head = numpy.where(same, next_head,
+                            heads[numpy.searchsorted(head_group, head_group)])
+    tails = preceding[next_head]
+
+    result = rows[heads].copy()
+    for field in ('end_x', 'end_y', 'end_angle'):
+        result[field] = rows[field][tails]
+    return result, tails < heads
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import predicates
 from precision import FloatingPoint
 from geocomp.common import point
 
@@ -23,51 +24,51 @@ class Point(point.Point):
                 FloatingPoint.is_zero(self.y - point.y)
 
     def relative_quadrant(self, origin):
-        p = self.__translate(origin)
-        if p.x >= 0 and p.y > 0: return 1
-        elif p.x <= 0 and p.y >= 0: return 2
-        elif p.x <= 0 and p.y <= 0: return 3
-        else: return 4
+        return predicates.quadrant(self.x - origin.x, self.y - origin.y)
 
     def area(self, point1, point2):
-        return (point1.x - self.x) * (point2.y - self.y) - \
-               (point1.y - self.y) * (point2.x - self.x)
+        return predicates.area(self.x, self.y, point1.x, point1.y,
+                               point2.x, point2.y)
 
     def colinear(self, point1, point2):
-        return FloatingPoint.is_zero(self.area(point1, point2))
+        return predicates.colinear(self.x, self.y, point1.x, point1.y,
+                                   point2.x, point2.y)
 
     def on_the_left_of(self, segment):
         return self.on_the_left_side(segment.left_extreme, segment.right_extreme)
 
     def on_the_left_side(self, left_extreme, right_extreme):
-        return self.area(left_extreme, right_extreme) > 0
+        return predicates.on_the_left_side(
+            self.x, self.y, left_extreme.x, left_extreme.y,
+            right_extreme.x, right_extreme.y)
 
     def strictly_in_line_segment(self, point1, point2):
-        if not self.colinear(point1, point2): return False
-
-        if point1.x != point2.x:
-            return (point1.x < self.x < point2.x) or \
-                   (point2.x < self.x < point1.x)
-        else:
-            return (point1.y < self.y < point2.y) or \
-                   (point2.y < self.y < point1.y)
-
-    def __translate(self, origin):
-        return Point(self.x - origin.x, self.y - origin.y)
+        return predicates.strictly_in_line_segment(
+            self.x, self.y, point1.x, point1.y, point2.x, point2.y)
 
 
 class LineSegment:
     origin = None
 
-    def __init__(self, p, q):
-        if LineSegment.origin is None:
-            raise Exception('Must call static method set_origin first')
+    def __init__(self, p, q, origin=None):
+        if origin is None: origin = LineSegment.origin
+        if origin is None:
+            raise Exception('Must give an origin or call static method set_origin first')
 
-        if LineSegment.origin.on_the_left_side(p, q):
+        if origin.on_the_left_side(p, q):
             self.__set_segment(p, q)
         else: self.__set_segment(q, p)
         self.index = p.index
 
+        # record of the extremes and the line a x + b y + c = 0 from the left
+        # to the right extreme, positive at the origin, for line_side
+        left, right = self.left_extreme, self.right_extreme
+        a = left.y - right.y
+        b = right.x - left.x
+        c = left.x * right.y - right.x * left.y
+        self.line = (left.x, left.y, right.x, right.y, a, b, c,
+                     abs(left.x * right.y) + abs(right.x * left.y))
+
     def __repr__(self):
         return '[' + repr(self.left_extreme) + '; ' + repr(self.right_extreme) + ']'
 
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+
+import numpy
+
+
+INTERVAL = numpy.dtype([('segment', '<i8'),
+                        ('start_x', '<f8'), ('start_y', '<f8'),
+                        ('end_x', '<f8'), ('end_y', '<f8'),
+                        ('start_angle', '<f8'), ('end_angle', '<f8')])
+
+
+# Pieces of intervals narrower than this angle, left when an interval is cut
+# at a ray it ends on up to rounding, are dropped
+ANGLE_TOLERANCE = 1e-12
+
+
+# Visible intervals of a scan stored as one record array, grouped by segment
+# and, inside a segment, in the order the scan found them. Angles are polar
+# angles around the guard in [0, 2pi]; an interval that ends on the starting
+# ray ends at 2pi. Only the segments with intervals are indexed: segments
+# lists them in increasing order and the intervals of segments[i] are the
+# rows from offsets[i] to offsets[i + 1], so the size does not depend on
+# segment_count.
+class VisibleIntervals(object):
+    def __init__(self, segment_count, rows):
+        self.segment_count = segment_count
+        self.rows = rows
+        segment = rows['segment']
+        first = numpy.ones(len(segment), dtype=bool)
+        first[1:] = segment[1:] != segment[:-1]
+        first = numpy.flatnonzero(first)
+        self.segments = segment[first]
+        self.offsets = numpy.append(first, len(segment))
+
+    # Builds the intervals from arrays of segment indices, start points and
+    # end points, given as (m, 2) arrays
+    @staticmethod
+    def from_arrays(segment_count, guard, segment, start, end):
+        segment = numpy.asarray(segment, dtype=numpy.int64)
+        start = numpy.asarray(start, dtype=float).reshape(-1, 2)
+        end = numpy.asarray(end, dtype=float).reshape(-1, 2)
+
+        rows = numpy.empty(len(segment), dtype=INTERVAL)
+        rows['segment'] = segment
+        rows['start_x'] = start[:, 0]
+        rows['start_y'] = start[:, 1]
+        rows['end_x'] = end[:, 0]
+        rows['end_y'] = end[:, 1]
+        rows['start_angle'] = polar_angles(start, guard)
+        end_angle = polar_angles(end, guard)
+        rows['end_angle'] = numpy.where(end_angle < rows['start_angle'],
+                                        end_angle + 2 * numpy.pi, end_angle)
+
+        order = numpy.argsort(segment, kind='mergesort')
+        return VisibleIntervals(segment_count, rows[order])
+
+    @staticmethod
+    def from_visible_segments(result, guard):
+        segment = []
+        points = []
+        for index, start, end in result.intervals():
+            segment.append(index)
+            points.append((start.x, start.y, end.x, end.y))
+        points = numpy.array(points, dtype=float).reshape(-1, 4)
+        return VisibleIntervals.from_arrays(len(result.visible_sections), guard,
+                                            segment, points[:, :2], points[:, 2:])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getattr__(self, name):
+        if name in INTERVAL.names: return self.rows[name]
+        raise AttributeError(name)
+
+    # Intervals of segment k, as a view of the rows
+    def of_segment(self, k):
+        i = numpy.searchsorted(self.segments, k)
+        if i == len(self.segments) or self.segments[i] != k:
+            return self.rows[:0]
+        return self.rows[self.offsets[i]:self.offsets[i + 1]]
+
+    # The same intervals, for the segments of a scene of segment_count
+    # segments in which segment k of this one is segment indices[k]. The
+    # indices must be increasing.
+    def renumbered(self, segment_count, indices):
+        rows = self.rows.copy()
+        rows['segment'] = numpy.asarray(indices)[rows['segment']]
+        return VisibleIntervals(segment_count, rows)
+
+    # The parts of the intervals seen along the rays from the guard with polar
+    # angles from start to start + width, in the order of those rays. The
+    # segments lie on the lines through coordinates[k] = (x0, y0, x1, y1).
+    def within_sector(self, guard, start, width, coordinates):
+        rows = self.rows
+        start = numpy.mod(start, 2 * numpy.pi)
+        point = rows['start_angle'] == rows['end_angle']
+        pieces = []
+        for turn in (-1, 0, 1):
+            low = start + 2 * numpy.pi * turn
+            first = numpy.maximum(rows['start_angle'], low)
+            last = numpy.minimum(rows['end_angle'], low + width)
+            # single points seen along one ray are kept where they lie
+            inside = numpy.flatnonzero((last - first > ANGLE_TOLERANCE) |
+                                       (point & (first == last) &
+                                        (last < low + width)))
+            pieces.append((inside, first[inside], last[inside], low))
+
+        segment = numpy.concatenate([rows['segment'][p[0]] for p in pieces])
+        first = numpy.concatenate([p[1] for p in pieces])
+        last = numpy.concatenate([p[2] for p in pieces])
+        index = numpy.concatenate([p[0] for p in pieces])
+        offset = numpy.concatenate([p[1] - p[3] for p in pieces])
+        order = numpy.argsort(offset, kind='mergesort')
+        segment, first, last, index = (segment[order], first[order],
+                                       last[order], index[order])
+
+        lines = numpy.asarray(coordinates, dtype=float)[segment]
+        start_points = numpy.where(
+            (first == rows['start_angle'][index])[:, None],
+            numpy.column_stack((rows['start_x'], rows['start_y']))[index],
+            line_hits(guard, first, lines))
+        end_points = numpy.where(
+            (last == rows['end_angle'][index])[:, None],
+            numpy.column_stack((rows['end_x'], rows['end_y']))[index],
+            line_hits(guard, last, lines))
+        return VisibleIntervals.from_arrays(self.segment_count, guard, segment,
+                                            start_points, end_points)
+
+    # The intervals of the given segments only
+    def of_segments(self, segments):
+        rows = self.rows[numpy.in1d(self.rows['segment'], segments)]
+        return VisibleIntervals(self.segment_count, rows)
+
+    def visible(self):
+        return self.segments
+
+    def __repr__(self):
+        coordinates = self.rows[['start_x', 'start_y', 'end_x', 'end_y']]
+        coordinates = coordinates.tolist()
+        offsets = self.offsets.tolist()
+        group = dict((k, i) for i, k in enumerate(self.segments.tolist()))
+        lines = []
+        for k in range(self.segment_count):
+            lines.append(str(k) + ': ')
+            if k in group:
+                i = group[k]
+                for row in coordinates[offsets[i]:offsets[i + 1]]:
+                    lines.append('[(%r, %r); (%r, %r)]; ' % row)
+            lines.append('\n')
+        return ''.join(lines)
+
+    def write_text(self, stream):
+        stream.write(repr(self))
+
+    # One JSON object per line and interval
+    def write_json_lines(self, stream):
+        line = '{"segment": %d, "start": [%r, %r], "end": [%r, %r], ' \
+               '"angles": [%r, %r]}\n'
+        for row in self.rows.tolist():
+            stream.write(line % row)
+
+    # Binary form: the number of segments and of intervals, as two little
+    # endian int64, followed by the raw rows
+    def write_binary(self, stream):
+        numpy.array([self.segment_count, len(self.rows)],
+                    dtype='<i8').tofile(stream)
+        self.rows.tofile(stream)
+
+    @staticmethod
+    def read_binary(stream):
+        segment_count, count = numpy.fromfile(stream, dtype='<i8', count=2)
+        rows = numpy.fromfile(stream, dtype=INTERVAL, count=count)
+        return VisibleIntervals(int(segment_count), rows)
+
+
+# Index of the intervals of a scan around its guard by polar angle, for
+# ray shooting and point visibility queries by binary search. Intervals that
+# go past the starting ray are split there, so the pieces cover disjoint
+# ranges of angles in [0, 2pi] and are sorted by their first angle. Single
+# points seen along one ray are left out.
+class AngularIndex(object):
+    def __init__(self, intervals, guard):
+        self.guard = guard = (float(guard[0]), float(guard[1]))
+        rows = intervals.rows
+        lines = numpy.column_stack((rows['start_x'], rows['start_y'],
+                                    rows['end_x'], rows['end_y']))
+        wraps = numpy.flatnonzero(rows['end_angle'] > 2 * numpy.pi)
+
+        start = numpy.concatenate((rows['start_angle'],
+                                   numpy.zeros(len(wraps))))
+        end = numpy.concatenate((numpy.minimum(rows['end_angle'], 2 * numpy.pi),
+                                 rows['end_angle'][wraps] - 2 * numpy.pi))
+        segment = numpy.concatenate((rows['segment'], rows['segment'][wraps]))
+        lines = numpy.concatenate((lines, lines[wraps]))
+
+        # pieces of no width would hide the ones starting at the same angle
+        order = numpy.flatnonzero(end > start)
+        order = order[numpy.argsort(start[order], kind='mergesort')]
+        self.start = start[order]
+        self.end = end[order]
+        self.segment = segment[order]
+        self.lines = lines[order]
+
+    # Segments the rays with the given polar angles hit first, -1 where they
+    # hit none, and the points they hit (nan where they hit none)
+    def shoot(self, angles):
+        angles = numpy.mod(numpy.asarray(angles, dtype=float), 2 * numpy.pi)
+        segment = numpy.empty(angles.shape, dtype=numpy.int64)
+        segment.fill(-1)
+        points = numpy.empty(angles.shape + (2,))
+        points.fill(numpy.nan)
+        if len(self.start) == 0: return segment, points
+
+        piece = numpy.searchsorted(self.start, angles, side='right') - 1
+        piece = numpy.maximum(piece, 0)
+        hit = (angles >= self.start[piece]) & (angles <= self.end[piece])
+        segment[hit] = self.segment[piece[hit]]
+        points[hit] = line_hits(self.guard, angles[hit], self.lines[piece[hit]])
+        return segment, points
+
+    def shoot_ray(self, angle):
+        segment, points = self.shoot([angle])
+        return int(segment[0]), tuple(points[0])
+
+    # Tells which of the points (x, y) the guard sees: those whose ray hits no
+    # segment, or hits it no nearer than the point itself
+    def sees(self, x, y):
+        dx = numpy.asarray(x, dtype=float) - self.guard[0]
+        dy = numpy.asarray(y, dtype=float) - self.guard[1]
+        segment, points = self.shoot(numpy.arctan2(dy, dx))
+        hit_distance = numpy.hypot(points[..., 0] - self.guard[0],
+                                   points[..., 1] - self.guard[1])
+        hidden = numpy.hypot(dx, dy) > numpy.where(segment < 0, numpy.inf,
+                                                   hit_distance)
+        return ~hidden
+
+    def sees_point(self, x, y):
+        return bool(self.sees([x], [y])[0])
+
+
+# Points where the rays from the guard with the given polar angles meet the
+# lines through the points (x0, y0) and (x1, y1) of lines[k], as an (m, 2)
+# array
+def line_hits(guard, angles, lines):
+    dx = numpy.cos(angles)
+    dy = numpy.sin(angles)
+    ex = lines[:, 2] - lines[:, 0]
+    ey = lines[:, 3] - lines[:, 1]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        t = ((lines[:, 0] - guard[0]) * ey - (lines[:, 1] - guard[1]) * ex) / \
+            (dx * ey - dy * ex)
+    return numpy.column_stack((guard[0] + t * dx, guard[1] + t * dy))
+
+
+# Polar angles in [0, 2pi) of the (m, 2) points around the guard
+def polar_angles(points, guard):
+    angles = numpy.arctan2(points[:, 1] - guard[1], points[:, 0] - guard[0])
+    return numpy.where(angles < 0, angles + 2 * numpy.pi, angles)
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+import numpy
+from bbstree import BalancedBinarySearchTree
+from scanline import STARTING_RAY
+from scanline import SweepEvents
+from scanline import determine_visibility
+
+# The scan line is saved every CHECKPOINT events, so that a sweep can be
+# taken up again from any place after at most that many events
+CHECKPOINT = 8
+
+
+# Visibility from a guard moving over a fixed Scene, one position at a time.
+# Each position starts its polar order from the previous one, so only the
+# extremes whose order changed are moved. The sweep is kept between positions
+# as well: the segment first on the scan line after every event, what every
+# event reported and the scan line itself every CHECKPOINT events. Where the
+# new order has the same events as the old one before and after an event, as
+# a set, that event reports the same as before; only the runs of events in
+# between, where adjacent events were swapped, are swept again, from the scan
+# line saved before them. A change among the segments crossing the starting
+# ray starts the sweep over.
+class KineticScan(object):
+    def __init__(self, scene):
+        self.scene = scene
+        self.view = None
+        self.events = None
+        self.intervals = set()
+
+        self.initial = None
+        self.minimum = None
+        self.counts = None
+        self.snapshots = None
+
+    def move(self, x, y):
+        previous = self.view
+        if previous is None: view = self.scene.view(x, y)
+        else: view = self.scene.view(x, y, previous.order)
+
+        if previous is None or \
+           view.initial_segments != previous.initial_segments:
+            replayed = self.sweep(view)
+        else:
+            replayed = self.update(view, previous)
+        self.view = view
+
+        events = self.events
+        xs, ys = view.event_coordinates(events.segments, events.rays)
+        intervals = events.visible_intervals(len(self.scene), (view.x, view.y),
+                                             xs, ys)
+        symbolic = set(events.symbolic_intervals())
+        step = KineticStep(intervals, sorted(symbolic - self.intervals),
+                           sorted(self.intervals - symbolic), view.repaired,
+                           replayed)
+        self.intervals = symbolic
+        return step
+
+    # Steps of the guard along a polyline, given as its vertices (x, y), every
+    # spacing units of length
+    def follow(self, vertices, spacing):
+        for x, y in sample_polyline(vertices, spacing):
+            yield self.move(x, y)
+
+    # Sweeps the whole view, as scanline.scene_sweep, saving its state.
+    # Returns the number of events swept.
+    def sweep(self, view):
+        n = len(view.events)
+        scan_line = BalancedBinarySearchTree(view.compare_segments)
+        scan_line.load_sorted(view.initial_segments)
+        self.initial = scan_line.min()
+        self.minimum = [None] * n
+        self.snapshots = {0: list(view.initial_segments)}
+
+        self.events = SweepEvents()
+        if self.initial is not None:
+            self.events.openVisibleInterval(self.initial, STARTING_RAY)
+        self.counts = numpy.array(self.replay(view, scan_line, 0, 0, n,
+                                              self.events), dtype=int)
+        if self.initial is not None:
+            self.events.closeVisibleInterval(self.initial, STARTING_RAY)
+        return n
+
+    # Sweeps again the events of view whose surroundings differ from those in
+    # the order of previous, and splices what they report into the events of
+    # the last sweep. Returns the number of events swept.
+    def update(self, view, previous):
+        n = len(view.events)
+        position = numpy.empty(n, dtype=int)
+        position[previous.order] = numpy.arange(n)
+        # same set of events as before ahead of each place in the order
+        same = numpy.ones(n + 1, dtype=bool)
+        same[1:] = numpy.maximum.accumulate(position[view.order]) == \
+                   numpy.arange(n)
+        changed = ~(same[:-1] & same[1:])
+        if not changed.any(): return 0
+
+        bounds = numpy.flatnonzero(numpy.diff(numpy.r_[0, changed, 0]))
+        old = self.events
+        offsets = (0 if self.initial is None else 1) + \
+                  numpy.r_[0, numpy.cumsum(self.counts)]
+        events = SweepEvents()
+        copied = 0
+        scan_line = None
+        applied = 0
+        replayed = 0
+        for first, last in zip(bounds[0::2].tolist(), bounds[1::2].tolist()):
+            start = first - first % CHECKPOINT
+            if scan_line is None or not start <= applied <= first:
+                scan_line = BalancedBinarySearchTree(view.compare_segments)
+                scan_line.load_sorted(self.snapshots[start])
+                applied = start
+
+            end = offsets[first]
+            events.segments.extend(old.segments[copied:end])
+            events.rays.extend(old.rays[copied:end])
+            events.opening.extend(old.opening[copied:end])
+            self.counts[first:last] = self.replay(view, scan_line, applied,
+                                                  first, last, events)
+            copied = offsets[last]
+            replayed += last - applied
+            applied = last
+
+        events.segments.extend(old.segments[copied:])
+        events.rays.extend(old.rays[copied:])
+        events.opening.extend(old.opening[copied:])
+        self.events = events
+        return replayed
+
+    # Applies the events of view from start to end to the scan line, which
+    # holds the segments crossing the rays before event start. The events
+    # from first on report their intervals to result and update the saved
+    # state. Returns how many interval extremes each of those reported.
+    def replay(self, view, scan_line, start, first, end, result):
+        order = view.events
+        minimum = self.minimum
+        last_visible = self.initial if start == 0 else minimum[start - 1]
+        counts = []
+        for i in range(start, end):
+            segment = order[i] >> 1
+            if order[i] & 1:
+                scan_line.remove(segment)
+                case = 'remotion'
+            else:
+                scan_line.insert(segment)
+                case = 'insertion'
+            current_visible = scan_line.min()
+            if i >= first:
+                reported = len(result.segments)
+                determine_visibility(case, current_visible, last_visible,
+                                     segment, result)
+                counts.append(len(result.segments) - reported)
+                minimum[i] = current_visible
+                if (i + 1) % CHECKPOINT == 0:
+                    self.snapshots[i + 1] = list(scan_line.values())
+            last_visible = current_visible
+        return counts
+
+
+# Result of KineticScan.move: the visible intervals from the new position,
+# the intervals (segment, start ray, end ray) that appeared and disappeared
+# since the last one, the inversions repaired in the polar order (None when
+# it was sorted anew) and the number of events swept for this position
+# (none when the sweep was reused as it was)
+class KineticStep(object):
+    def __init__(self, intervals, appeared, disappeared, repaired, replayed):
+        self.intervals = intervals
+        self.appeared = appeared
+        self.disappeared = disappeared
+        self.repaired = repaired
+        self.replayed = replayed
+        self.reused = replayed == 0
+
+
+# Points along a polyline every spacing units of length, from its first
+# vertex to its last
+def sample_polyline(vertices, spacing):
+    vertices = [(float(x), float(y)) for x, y in vertices]
+    if not vertices: return
+    yield vertices[0]
+    walked = 0.0
+    for (x0, y0), (x1, y1) in zip(vertices, vertices[1:]):
+        length = ((x1 - x0) ** 2 + (y1 - y0) ** 2) ** 0.5
+        position = spacing - walked
+        while position <= length:
+            t = position / length
+            yield x0 + t * (x1 - x0), y0 + t * (y1 - y0)
+            position += spacing
+        walked = (walked + length) % spacing
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+import time
+import numpy
+from scene import Scene
+from scanline import scan_scene_intervals
+
+
+# Scene of the worker processes, attached to the shared coordinates
+worker_scene = None
+
+
+def attach_scene(shared_coordinates, count):
+    global worker_scene
+    coordinates = numpy.frombuffer(shared_coordinates, dtype=float)
+    worker_scene = Scene(coordinates.reshape(count, 4))
+
+
+def scan_chunk(chunk):
+    first_guard, guards = chunk
+    started = time.time()
+    guard_index = []
+    segment_index = []
+    coordinates = []
+    for offset, (x, y) in enumerate(guards.tolist()):
+        if worker_scene.touches(x, y):
+            raise Exception('Guard must not lie on a segment')
+        rows = scan_scene_intervals(worker_scene, x, y).rows
+        guard_index.append(numpy.repeat(first_guard + offset, len(rows)))
+        segment_index.append(rows['segment'])
+        coordinates.append(numpy.column_stack((rows['start_x'], rows['start_y'],
+                                               rows['end_x'], rows['end_y'])))
+    return (numpy.concatenate(guard_index).astype(numpy.int64),
+            numpy.concatenate(segment_index).astype(numpy.int64),
+            numpy.concatenate(coordinates),
+            time.time() - started)
+
+
+# Visible intervals of many guards, one row per interval. The rows of guard g
+# are rows offsets[g] to offsets[g + 1] - 1.
+class ParallelScan(object):
+    def __init__(self, guard_count, guard, segment, coordinates,
+                 processes, elapsed, busy):
+        self.guard = guard
+        self.segment = segment
+        self.coordinates = coordinates
+        self.offsets = numpy.searchsorted(guard, numpy.arange(guard_count + 1))
+        self.processes = processes
+        self.elapsed = elapsed
+        self.busy = busy
+
+    def __len__(self):
+        return len(self.guard)
+
+    # Fraction of the ideal speedup reached: total time spent scanning over
+    # the wall-clock time of all processes
+    def efficiency(self):
+        if self.elapsed == 0: return 1.0
+        return self.busy / (self.elapsed * self.processes)
+
+    def rows_of(self, guard):
+        return slice(self.offsets[guard], self.offsets[guard + 1])
+
+
+# Scans every guard of the (m, 2) array guards over scene, spreading chunks of
+# guards across a pool of processes. The workers read the segment coordinates
+# from shared memory instead of receiving a copy of the scene.
+def parallel_scan(scene, guards, processes=None, chunk_size=None):
+    guards = numpy.asarray(guards, dtype=float).reshape(-1, 2)
+    if processes is None: processes = multiprocessing.cpu_count()
+    if chunk_size is None:
+        chunk_size = max(1, len(guards) // (4 * processes))
+
+    shared_coordinates = multiprocessing.RawArray('d', scene.coordinates.size)
+    numpy.frombuffer(shared_coordinates, dtype=float)[:] = \
+        scene.coordinates.ravel()
+
+    chunks = [(k, guards[k:k + chunk_size])
+              for k in range(0, len(guards), chunk_size)]
+
+    started = time.time()
+    pool = multiprocessing.Pool(processes, attach_scene,
+                                (shared_coordinates, len(scene)))
+    try:
+        parts = pool.map(scan_chunk, chunks, 1)
+    finally:
+        pool.close()
+        pool.join()
+    elapsed = time.time() - started
+
+    if not parts:
+        parts = [(numpy.zeros(0, dtype=numpy.int64),
+                  numpy.zeros(0, dtype=numpy.int64), numpy.zeros((0, 4)), 0.0)]
+    return ParallelScan(len(guards),
+                        numpy.concatenate([part[0] for part in parts]),
+                        numpy.concatenate([part[1] for part in parts]),
+                        numpy.concatenate([part[2] for part in parts]),
+                        processes, elapsed, sum(part[3] for part in parts))
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+import math
+import numpy
+from intervals import AngularIndex
+from scanline import scan_scene_intervals
+from visgraph import VertexFinder
+from visgraph import VisibilityGraph
+
+
+# Shortest obstacle avoiding paths between points of a scene, over the
+# visibility graph of its segment extremes. Every query point is joined to
+# the graph by a radar scan from it; scans are kept, so points that come
+# back in later queries are not scanned again.
+class PathFinder(object):
+    def __init__(self, scene, graph=None, cache_directory=None):
+        self.scene = scene
+        if graph is None:
+            if cache_directory is None: graph = VisibilityGraph.build(scene)
+            else: graph = VisibilityGraph.load(scene, cache_directory)
+        self.graph = graph
+        self.finder = VertexFinder(graph.vertices)
+        self.scans = {}
+
+    # The vertices seen from (x, y), the distances to them, and the angular
+    # index of the scan from there
+    def connect(self, x, y):
+        key = (float(x), float(y))
+        if key not in self.scans:
+            if self.scene.touches(x, y):
+                raise Exception('Point must not lie on a segment')
+            intervals = scan_scene_intervals(self.scene, x, y)
+            points = numpy.column_stack((
+                numpy.concatenate((intervals.start_x, intervals.end_x)),
+                numpy.concatenate((intervals.start_y, intervals.end_y))))
+            seen = numpy.unique(self.finder.find(points))
+            distances = numpy.hypot(*(self.graph.vertices[seen] - key).T)
+            self.scans[key] = (seen.tolist(), distances.tolist(),
+                               AngularIndex(intervals, key))
+        return self.scans[key]
+
+    # Length of the shortest path from source to target, given as (x, y), and
+    # the points along it; infinity and no points when there is none
+    def shortest_path(self, source, target):
+        source = (float(source[0]), float(source[1]))
+        target = (float(target[0]), float(target[1]))
+        seen, distances, index = self.connect(*source)
+        if index.sees_point(*target):
+            return math.hypot(target[0] - source[0],
+                              target[1] - source[1]), [source, target]
+        target_seen, target_distances = self.connect(*target)[:2]
+        return self.search(source, target, zip(seen, distances),
+                           dict(zip(target_seen, target_distances)))
+
+    # Shortest paths from every source to every target, as a matrix of
+    # lengths and a matching list of lists of paths
+    def shortest_paths(self, sources, targets):
+        lengths = numpy.empty((len(sources), len(targets)))
+        paths = []
+        for i, source in enumerate(sources):
+            row = []
+            for j, target in enumerate(targets):
+                lengths[i, j], path = self.shortest_path(source, target)
+                row.append(path)
+            paths.append(row)
+        return lengths, paths
+
+    # A* from the source, joined to the vertices it sees, to the target,
+    # joined from the vertices in target_links, with the straight line
+    # distance to the target as heuristic
+    def search(self, source, target, source_links, target_links):
+        vertices = self.graph.vertices
+        indptr = self.graph.indptr
+        indices = self.graph.indices
+        weights = self.graph.weights
+        tx, ty = target
+
+        def estimate(v):
+            x, y = vertices[v]
+            return math.hypot(tx - x, ty - y)
+
+        best = {}
+        parent = {}
+        heap = []
+        for v, distance in source_links:
+            if distance < best.get(v, float('inf')):
+                best[v] = distance
+                parent[v] = None
+                heapq.heappush(heap, (distance + estimate(v), distance, v))
+
+        TARGET = -1
+        done = set()
+        while heap:
+            priority, distance, v = heapq.heappop(heap)
+            if v == TARGET: break
+            if v in done: continue
+            done.add(v)
+
+            if v in target_links:
+                total = distance + target_links[v]
+                if total < best.get(TARGET, float('inf')):
+                    best[TARGET] = total
+                    parent[TARGET] = v
+                    heapq.heappush(heap, (total, total, TARGET))
+
+            first, last = indptr[v], indptr[v + 1]
+            for u, weight in zip(indices[first:last].tolist(),
+                                 weights[first:last].tolist()):
+                if u in done: continue
+                candidate = distance + weight
+                if candidate < best.get(u, float('inf')):
+                    best[u] = candidate
+                    parent[u] = v
+                    heapq.heappush(heap, (candidate + estimate(u), candidate, u))
+
+        if TARGET not in best: return float('inf'), []
+        path = [target]
+        v = parent[TARGET]
+        while v is not None:
+            path.append(tuple(vertices[v].tolist()))
+            v = parent[v]
+        path.append(source)
+        path.reverse()
+        return best[TARGET], path
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+
+import numpy
+from geometry import LineSegment
+from precision import EPSILON
+from predicates import compare_polar
+
+# Bound on the relative rounding error between two pseudo-angles, each a
+# quotient of two rounded differences
+PSEUDO_ANGLE_ERROR = 8.0 * EPSILON
+
+
+def compare_polar_angles(point1, point2, origin=None):
+    if origin is None: origin = LineSegment.origin
+    return compare_polar(origin.x, origin.y,
+                         point1.x, point1.y, point1.is_left_extreme,
+                         point2.x, point2.y, point2.is_left_extreme)
+
+
+# Sortable keys equivalent to compare_polar_angles. Angles run over (0, 2pi],
+# so the +x ray belongs to the 4th quadrant. Inside a quadrant the slope ratio
+# is a monotone pseudo-angle; points on the same ray put left extremes first
+# (nearest first) and right extremes after them (farthest first).
+def polar_keys(dx, dy, is_left):
+    dx = numpy.asarray(dx, dtype=float)
+    dy = numpy.asarray(dy, dtype=float)
+    is_left = numpy.asarray(is_left, dtype=bool)
+
+    quadrant = numpy.empty(len(dx), dtype=numpy.int8)
+    quadrant.fill(4)
+    quadrant[(dx <= 0) & (dy <= 0)] = 3
+    quadrant[(dx <= 0) & (dy >= 0)] = 2
+    quadrant[(dx >= 0) & (dy > 0)] = 1
+
+    odd = (quadrant == 1) | (quadrant == 3)
+    numerator = numpy.where(odd, -dx, dy)
+    denominator = numpy.where(odd, dy, dx)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        pseudo_angle = numerator / denominator
+
+    distance = numpy.maximum(numpy.abs(dx), numpy.abs(dy))
+    distance = numpy.where(is_left, distance, -distance)
+    return quadrant, pseudo_angle, ~is_left, distance
+
+
+def polar_order(dx, dy, is_left):
+    quadrant, pseudo_angle, is_right, distance = polar_keys(dx, dy, is_left)
+    order = numpy.lexsort((distance, is_right, pseudo_angle, quadrant))
+
+    # runs whose pseudo-angles are too close for rounding to tell them apart
+    q = quadrant[order]
+    a = pseudo_angle[order]
+    with numpy.errstate(invalid='ignore'):
+        close = (a[1:] == a[:-1]) | (numpy.abs(a[1:] - a[:-1]) <= PSEUDO_ANGLE_ERROR *
+                 numpy.maximum(numpy.abs(a[1:]), numpy.abs(a[:-1])))
+    tied = (q[1:] == q[:-1]) & close
+    return order, tied
+
+
+# Same as polar_order for integer dx and dy. The pseudo-angles only bucket
+# the extremes: reduced directions tell exactly which extremes share a ray,
+# and the runs of close pseudo-angles that mix several rays are the only ones
+# reported as tied. The extremes of one ray are already in order.
+def exact_polar_order(dx, dy, is_left):
+    dx = numpy.asarray(dx, dtype=numpy.int64)
+    dy = numpy.asarray(dy, dtype=numpy.int64)
+    quadrant, pseudo_angle, is_right, distance = polar_keys(dx, dy, is_left)
+    divisor = numpy.gcd(dx, dy)
+    divisor[divisor == 0] = 1
+    ray_x = dx // divisor
+    ray_y = dy // divisor
+    order = numpy.lexsort((distance, is_right, ray_y, ray_x, pseudo_angle,
+                           quadrant))
+
+    q = quadrant[order]
+    a = pseudo_angle[order]
+    with numpy.errstate(invalid='ignore'):
+        close = (q[1:] == q[:-1]) & ((a[1:] == a[:-1]) |
+            (numpy.abs(a[1:] - a[:-1]) <= PSEUDO_ANGLE_ERROR *
+             numpy.maximum(numpy.abs(a[1:]), numpy.abs(a[:-1]))))
+    rx = ray_x[order]
+    ry = ray_y[order]
+    new_ray = close & ((rx[1:] != rx[:-1]) | (ry[1:] != ry[:-1]))
+
+    run = numpy.cumsum(numpy.r_[0, ~close])
+    mixed = numpy.zeros(run[-1] + 1, dtype=bool)
+    mixed[run[1:][new_ray]] = True
+    return order, close & mixed[run[1:]]
+
+
+# Fraction of the extremes that may be out of order in a repair. Past it,
+# putting them back one by one costs more than sorting all of them anew.
+REPAIR_LIMIT = 1.0 / 64
+
+
+# Sorts order, extremes numbers already sorted for a nearby guard, for the
+# guard whose polar keys are quadrant and pseudo_angle. Consecutive extremes
+# are checked by their keys, and by the comparison function where the keys
+# are too close; those found out of order are taken out until the rest is
+# sorted, then put back by binary search. Returns the sorted array and the
+# number of inversions it repaired, or None and None once more than
+# REPAIR_LIMIT of the extremes have to be taken out.
+def repair_polar_order(order, quadrant, pseudo_angle, comparison):
+    order = numpy.asarray(order, dtype=numpy.intp)
+    position = numpy.arange(len(order))
+    limit = int(REPAIR_LIMIT * len(order))
+    taken_out = 0
+    moved = []
+    moved_position = []
+    while len(order) > 1:
+        q = quadrant[order]
+        a = pseudo_angle[order]
+        with numpy.errstate(invalid='ignore'):
+            close = (a[1:] == a[:-1]) | (numpy.abs(a[1:] - a[:-1]) <=
+                PSEUDO_ANGLE_ERROR * numpy.maximum(numpy.abs(a[1:]),
+                                                   numpy.abs(a[:-1])))
+            same = q[1:] == q[:-1]
+            inverted = (q[1:] < q[:-1]) | (same & ~close & (a[1:] < a[:-1]))
+        # every inverted pair takes out at least one more extreme
+        if taken_out + int(inverted.sum()) > limit: return None, None
+        pairs = numpy.flatnonzero(same & close)
+        for i, e, f in zip(pairs.tolist(), order[pairs].tolist(),
+                           order[pairs + 1].tolist()):
+            if comparison(e, f) > 0: inverted[i] = True
+        if not inverted.any(): break
+
+        out = numpy.zeros(len(order), dtype=bool)
+        out[:-1] |= inverted
+        out[1:] |= inverted
+        taken_out += int(out.sum())
+        if taken_out > limit: return None, None
+        moved.append(order[out])
+        moved_position.append(position[out])
+        order = order[~out]
+        position = position[~out]
+
+    if not moved: return order, 0
+
+    by_position = numpy.argsort(numpy.concatenate(moved_position))
+    moved = numpy.concatenate(moved)[by_position].tolist()
+    before = numpy.searchsorted(position,
+                                numpy.concatenate(moved_position)[by_position])
+    # the keys find where each moved extreme goes, up to the extremes whose
+    # keys are too close, among which the comparison function decides
+    q = quadrant[order]
+    a = pseudo_angle[order]
+    moved_q = quadrant[moved]
+    moved_a = pseudo_angle[moved]
+    with numpy.errstate(invalid='ignore'):
+        margin = numpy.where(numpy.isinf(moved_a), 0.0,
+                             PSEUDO_ANGLE_ERROR * numpy.abs(moved_a))
+    low = numpy.empty(len(moved), dtype=int)
+    high = numpy.empty(len(moved), dtype=int)
+    for k in (1, 2, 3, 4):
+        first = numpy.searchsorted(q, k, side='left')
+        last = numpy.searchsorted(q, k, side='right')
+        mine = moved_q == k
+        low[mine] = first + numpy.searchsorted(a[first:last],
+                                               moved_a[mine] - margin[mine],
+                                               side='left')
+        high[mine] = first + numpy.searchsorted(a[first:last],
+                                                moved_a[mine] + margin[mine],
+                                                side='right')
+    slots = []
+    for e, start, end in zip(moved, low.tolist(), high.tolist()):
+        if start < end:
+            start += insertion_point(order[start:end].tolist(), e, comparison)
+        slots.append(start)
+    # a moved extreme changes places with the ones between its old and new
+    # places among those not moved
+    inversions = int(numpy.abs(before - numpy.array(slots)).sum())
+
+    groups = {}
+    for e, slot in zip(moved, slots):
+        groups.setdefault(slot, []).append(e)
+    placed = []
+    placed_slots = []
+    for slot in sorted(groups):
+        placed.extend(sorted(groups[slot], cmp=comparison))
+        placed_slots.extend([slot] * len(groups[slot]))
+    # the i-th extreme put back ends up at its slot plus i
+    rank = dict((e, slot + i)
+                for i, (e, slot) in enumerate(zip(placed, placed_slots)))
+
+    inversions += count_inversions([rank[e] for e in moved])
+    return numpy.insert(order, placed_slots, placed), inversions
+
+
+# Index where item goes in the sorted list items, after its equals
+def insertion_point(items, item, comparison):
+    low = 0
+    high = len(items)
+    while low < high:
+        middle = (low + high) // 2
+        if comparison(item, items[middle]) < 0: high = middle
+        else: low = middle + 1
+    return low
+
+
+# Number of pairs out of order in a sequence of distinct integers, counted
+# level by level of a bottom-up merge sort
+def count_inversions(values):
+    values = numpy.argsort(numpy.argsort(values, kind='mergesort'))
+    n = len(values)
+    inversions = 0
+    width = 1
+    while width < n:
+        block = numpy.arange(n) // (2 * width)
+        in_right = (numpy.arange(n) // width) % 2 == 1
+        keys = block * n + values
+        left_keys = numpy.sort(keys[~in_right])
+        right = numpy.flatnonzero(in_right)
+        greater = numpy.searchsorted(left_keys, block[right] * n + n) - \
+                  numpy.searchsorted(left_keys, keys[right], side='right')
+        inversions += int(greater.sum())
+        width *= 2
+    return inversions
+
+
+# Sorts the extremes exactly as sorted(extremes, cmp=compare_polar_angles)
+# would, comparing the points one by one only inside runs of equal keys.
+def sort_by_polar_angle(extremes, origin):
+    n = len(extremes)
+    if n == 0: return []
+
+    coordinates = numpy.fromiter((c for p in extremes for c in (p.x, p.y)),
+                                 dtype=float, count=2 * n).reshape(n, 2)
+    is_left = numpy.fromiter((p.is_left_extreme for p in extremes),
+                             dtype=bool, count=n)
+    order, tied = polar_order(coordinates[:, 0] - origin.x,
+                              coordinates[:, 1] - origin.y, is_left)
+
+    sorted_extremes = [extremes[i] for i in order.tolist()]
+    return resolve_ties(sorted_extremes, tied,
+                        lambda p, q: compare_polar_angles(p, q, origin))
+
+
+# Sorts with the comparison function the runs of items whose keys tied
+def resolve_ties(items, tied, comparison):
+    if not tied.any(): return items
+
+    starts = numpy.flatnonzero(tied & ~numpy.r_[False, tied[:-1]])
+    ends = numpy.flatnonzero(tied & ~numpy.r_[tied[1:], False]) + 2
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        items[start:end] = sorted(items[start:end], cmp=comparison)
+    return items
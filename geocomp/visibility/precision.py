@@ -1,8 +1,98 @@
 # -*- coding: utf-8 -*-
 
+import numpy
+from fractions import Fraction
+
 class FloatingPoint:
     epsilon = 1e-100
 
     @staticmethod
     def is_zero(value):
-        return abs(value) <= FloatingPoint.epsilon
\ No newline at end of file
+        return abs(value) <= FloatingPoint.epsilon
+
+
+# Relative rounding error of double precision arithmetic
+EPSILON = 2.0 ** -53
+# Error bound of the floating point orientation test, relative to the sum of
+# the magnitudes of its two products (Shewchuk's ccwerrboundA)
+ORIENTATION_ERROR = (3.0 + 16.0 * EPSILON) * EPSILON
+# Error bound of evaluating a x + b y + c for a line through two points,
+# relative to |a x| + |b y| plus the magnitude of the two products in c
+LINE_ERROR = 8.0 * EPSILON
+# Integer coordinates smaller than this in magnitude have their orientation
+# tests computed exactly in 64 bit integers
+INTEGER_LIMIT = 2 ** 30
+
+
+# Tells whether all values are integers within INTEGER_LIMIT
+def is_integral(values):
+    values = numpy.asarray(values)
+    small = numpy.abs(values) < INTEGER_LIMIT
+    if values.dtype.kind in 'iu': return bool(small.all())
+    return bool((small & (values == numpy.floor(values))).all())
+
+
+# Sign of (x1 - x) (y2 - y) - (y1 - y) (x2 - x), that is, 1 when (x, y) is on
+# the left of the line from (x1, y1) to (x2, y2), -1 when it is on the right
+# and 0 when the three points are colinear. The floating point value decides
+# unless it is within its error bound, in which case it is recomputed exactly.
+# With integer coordinates the value is exact to begin with.
+def orientation(x, y, x1, y1, x2, y2):
+    left = (x1 - x) * (y2 - y)
+    right = (y1 - y) * (x2 - x)
+    determinant = left - right
+    bound = ORIENTATION_ERROR * (abs(left) + abs(right))
+    if determinant > bound: return 1
+    elif -determinant > bound: return -1
+    elif isinstance(determinant, (int, long)): return cmp(determinant, 0)
+    return exact_orientation(x, y, x1, y1, x2, y2)
+
+
+def exact_orientation(x, y, x1, y1, x2, y2):
+    x = Fraction(x)
+    y = Fraction(y)
+    determinant = (Fraction(x1) - x) * (Fraction(y2) - y) - \
+                  (Fraction(y1) - y) * (Fraction(x2) - x)
+    if determinant > 0: return 1
+    elif determinant < 0: return -1
+    else: return 0
+
+
+# Same as orientation for arrays of points, as an array of signs. Integer
+# arrays, within INTEGER_LIMIT, are computed exactly in 64 bit integers.
+def orientations(x, y, x1, y1, x2, y2):
+    values = [numpy.asarray(v) for v in (x, y, x1, y1, x2, y2)]
+    if all(v.dtype.kind in 'iu' for v in values):
+        x, y, x1, y1, x2, y2 = [v.astype(numpy.int64) for v in values]
+        determinant = (x1 - x) * (y2 - y) - (y1 - y) * (x2 - x)
+        return numpy.sign(determinant).astype(numpy.int8)
+
+    x, y, x1, y1, x2, y2 = numpy.broadcast_arrays(
+        *[v.astype(float) for v in values])
+    left = (x1 - x) * (y2 - y)
+    right = (y1 - y) * (x2 - x)
+    determinant = left - right
+    bound = ORIENTATION_ERROR * (numpy.abs(left) + numpy.abs(right))
+
+    signs = numpy.zeros(determinant.shape, dtype=numpy.int8)
+    signs[determinant > bound] = 1
+    signs[-determinant > bound] = -1
+    for k in numpy.flatnonzero(numpy.abs(determinant) <= bound).tolist():
+        signs.flat[k] = exact_orientation(x.flat[k], y.flat[k], x1.flat[k],
+                                          y1.flat[k], x2.flat[k], y2.flat[k])
+    return signs
+
+
+# Side of (x, y) with respect to the line of a segment, given as the record
+# (x1, y1, x2, y2, a, b, c, magnitude) of its extremes, its line
+# a x + b y + c = 0 and |x1 y2| + |x2 y1|. Same sign as orientation(x, y, x1,
+# y1, x2, y2), but usually decided by the precomputed line alone.
+def line_side(x, y, line):
+    ax = line[4] * x
+    by = line[5] * y
+    value = ax + by + line[6]
+    bound = LINE_ERROR * (abs(ax) + abs(by) + line[7])
+    if value > bound: return 1
+    elif -value > bound: return -1
+    elif isinstance(value, (int, long)): return cmp(value, 0)
+    return orientation(x, y, line[0], line[1], line[2], line[3])
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+from precision import line_side
+from precision import orientation
+
+# Geometric predicates on plain coordinates. They build no objects, so the
+# comparison functions of the scan can call them in their inner loops. The
+# orientation tests are exact (see precision.orientation); the quadrant test
+# is exact as well, since the difference of two floats has the right sign.
+
+
+def quadrant(x, y):
+    if x >= 0 and y > 0: return 1
+    elif x <= 0 and y >= 0: return 2
+    elif x <= 0 and y <= 0: return 3
+    else: return 4
+
+
+def area(x, y, x1, y1, x2, y2):
+    return (x1 - x) * (y2 - y) - (y1 - y) * (x2 - x)
+
+
+def colinear(x, y, x1, y1, x2, y2):
+    return orientation(x, y, x1, y1, x2, y2) == 0
+
+
+def on_the_left_side(x, y, x1, y1, x2, y2):
+    return orientation(x, y, x1, y1, x2, y2) > 0
+
+
+def strictly_in_line_segment(x, y, x1, y1, x2, y2):
+    if not colinear(x, y, x1, y1, x2, y2): return False
+
+    if x1 != x2:
+        return (x1 < x < x2) or (x2 < x < x1)
+    else:
+        return (y1 < y < y2) or (y2 < y < y1)
+
+
+# Polar order around (ox, oy) of the extremes (x1, y1) and (x2, y2); left1
+# and left2 tell whether each one is a left extreme
+def compare_polar(ox, oy, x1, y1, left1, x2, y2, left2):
+    quadrant1 = quadrant(x1 - ox, y1 - oy)
+    quadrant2 = quadrant(x2 - ox, y2 - oy)
+    if quadrant1 != quadrant2:
+        if quadrant1 < quadrant2: return -1
+        else: return 1
+    else:
+        if strictly_in_line_segment(x1, y1, ox, oy, x2, y2):
+            if not left1: return 1
+            else: return -1
+        elif strictly_in_line_segment(x2, y2, ox, oy, x1, y1):
+            if not left2: return -1
+            else: return 1
+        else:
+            if on_the_left_side(x1, y1, ox, oy, x2, y2): return 1
+            else: return -1
+
+
+# Order, in the scan line around (ox, oy), of two distinct segments r and s
+# given by their line records (see precision.line_side), oriented from the
+# left to the right extreme, so positive on the side of the origin
+def compare_segments(ox, oy, r, s):
+    rlx, rly = r[0], r[1]
+    slx, sly = s[0], s[1]
+    if strictly_in_line_segment(rlx, rly, ox, oy, slx, sly):
+        return -1 # r < s
+    elif strictly_in_line_segment(slx, sly, ox, oy, rlx, rly):
+        return 1 # r > s
+
+    else:
+        if on_the_left_side(slx, sly, ox, oy, rlx, rly):
+            # r was inserted in the tree before s
+            if line_side(slx, sly, r) > 0:
+                return 1 # r > s
+            else: return -1 # r < s
+        else: # s was inserted in the tree before r
+            if line_side(rlx, rly, s) > 0:
+                return -1 # r < s
+            else: return 1 # r > s
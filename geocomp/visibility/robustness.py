@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Regression check of the floating point scan against exact arithmetic, on
+# integer scenes full of degeneracies: lattices, where many extremes share a
+# ray with the guard, and fans of nearly colinear segments far from it.
+# Each scene is swept translated by offsets that keep its coordinates exact
+# but not integral, so the float predicates run, and the results must be the
+# ones of the exact integer scan of the original scene; the polar order must
+# also be the one of the original comparator, compare_polar_angles, computed
+# in plain integers. Offsets that round the coordinates leave nearly
+# degenerate scenes, whose results must be the ones of the same scan with
+# every predicate decided exactly. Then every error bound and the exact
+# fallback is turned off in turn, to make sure the scenes depend on it.
+#
+#   python -m geocomp.visibility.robustness
+
+import sys
+import random
+import precision
+import polarsort
+from scene import Scene
+from scanline import SweepEvents
+from scanline import scene_sweep
+
+OFFSETS = (0.5, 2 ** 27 + 0.25)
+ROUNDED_OFFSETS = (0.1, 2 ** 28 / 3.0)
+
+
+# Segments in the cells of a size by size lattice of 3 by 3 cells, each one
+# between two of the points of its cell, and the guard at the center of an
+# empty cell
+def lattice_scene(size, seed):
+    generator = random.Random(seed)
+    guard_cell = (size // 2, size // 2)
+    points = [(x, y) for x in range(3) for y in range(3)]
+    segments = []
+    for i in range(size):
+        for j in range(size):
+            if (i, j) == guard_cell: continue
+            (x0, y0), (x1, y1) = generator.sample(points, 2)
+            segments.append((3 * i + x0, 3 * j + y0, 3 * i + x1, 3 * j + y1))
+    return (3 * guard_cell[0] + 1, 3 * guard_cell[1] + 1), segments
+
+
+# Unit segments on the lines y = x + c, about distance away from the guard
+# at the origin, and on the lines y = x + 2 c twice as far, where they start
+# from the double of a near extreme, or next to it. The angles of the
+# extremes differ by about 1 / distance^2, and the far extremes are on the
+# rays of the near ones, or off them by a cross product of c.
+def fan_scene(distance, count, seed):
+    generator = random.Random(seed)
+    segments = []
+    for c in (-2, -1, 1, 2, 3):
+        for j in range(count):
+            x = distance + 3 * j + generator.randint(0, 1)
+            segments.append((x, x + c, x + 1, x + 1 + c))
+            x = 2 * x + generator.randint(-1, 1)
+            segments.append((x, x + 2 * c, x + 1, x + 1 + 2 * c))
+    return (0, 0), segments
+
+
+def integer_quadrant(x, y):
+    if x >= 0 and y > 0: return 1
+    elif x <= 0 and y >= 0: return 2
+    elif x <= 0 and y <= 0: return 3
+    else: return 4
+
+
+# compare_polar_angles on integer extremes (x, y, is_left) relative to the
+# guard, with every product computed exactly
+def integer_compare_polar(p, q):
+    (x1, y1, left1), (x2, y2, left2) = p, q
+    quadrant1 = integer_quadrant(x1, y1)
+    quadrant2 = integer_quadrant(x2, y2)
+    if quadrant1 != quadrant2: return cmp(quadrant1, quadrant2)
+    cross = x1 * y2 - y1 * x2
+    if cross == 0:
+        if abs(x1) + abs(y1) < abs(x2) + abs(y2): return -1 if left1 else 1
+        else: return 1 if left2 else -1
+    return -1 if cross > 0 else 1
+
+
+def integer_polar_order(view):
+    extremes = [(view.extremes_x[e] - view.x, view.extremes_y[e] - view.y,
+                 e % 2 == 0) for e in range(len(view.extremes_x))]
+    return sorted(range(len(extremes)),
+                  cmp=lambda e, f: integer_compare_polar(extremes[e],
+                                                          extremes[f]))
+
+
+def sweep(view):
+    events = SweepEvents()
+    for step in scene_sweep(view, events): pass
+    return events.symbolic_intervals()
+
+
+def test_scenes():
+    scenes = [('lattice %d' % seed, lattice_scene(9, seed))
+              for seed in range(6)]
+    scenes += [('fan 2^%d' % power, fan_scene(2 ** power, 20, power))
+               for power in (26, 28)]
+    return scenes
+
+
+def translated_view(guard, segments, offset):
+    scene = Scene([[v + offset for v in s] for s in segments])
+    return scene.view(guard[0] + offset, guard[1] + offset)
+
+
+# Calls function with the module attributes of changes, (module, attribute,
+# value) triples, set to their values
+def patched(changes, function, *arguments):
+    originals = [getattr(module, attribute)
+                 for module, attribute, value in changes]
+    for module, attribute, value in changes: setattr(module, attribute, value)
+    try:
+        return function(*arguments)
+    finally:
+        for (module, attribute, value), original in zip(changes, originals):
+            setattr(module, attribute, original)
+
+
+# Error bounds so large that every predicate is decided exactly and every
+# pair of extremes in a quadrant is ordered by the comparison function
+EXACT_PREDICATES = [(precision, 'ORIENTATION_ERROR', 2.0),
+                    (precision, 'LINE_ERROR', 2.0),
+                    (polarsort, 'PSEUDO_ANGLE_ERROR', 2.0)]
+
+
+# Expected polar order and sweep of every test scene at every offset: the
+# ones of its integer view at the offsets that keep it exact, and the ones of
+# the view with exact predicates at the offsets that round it
+def expected_results(scenes):
+    results = []
+    for name, (guard, segments) in scenes:
+        view = Scene(segments).view(*guard)
+        assert view.exact
+        expected = (integer_polar_order(view), sweep(view))
+        results.append([expected for offset in OFFSETS])
+        for offset in ROUNDED_OFFSETS:
+            view = patched(EXACT_PREDICATES, translated_view,
+                           guard, segments, offset)
+            results[-1].append((view.events, patched(EXACT_PREDICATES,
+                                                     sweep, view)))
+    return results
+
+
+# Names of the scenes and offsets where the float scan disagrees
+def failures(scenes, expected):
+    failed = []
+    for (name, (guard, segments)), results in zip(scenes, expected):
+        for offset, (order, intervals) in zip(OFFSETS + ROUNDED_OFFSETS,
+                                              results):
+            view = translated_view(guard, segments, offset)
+            if view.events != order:
+                failed.append('%s + %r: polar order' % (name, offset))
+            elif sweep(view) != intervals:
+                failed.append('%s + %r: sweep' % (name, offset))
+    return failed
+
+
+def float_orientation(x, y, x1, y1, x2, y2):
+    return cmp((x1 - x) * (y2 - y) - (y1 - y) * (x2 - x), 0)
+
+
+# Each safeguard of the float predicates, as the module attribute that turns
+# it off and the value that does it
+SAFEGUARDS = [
+    ('ORIENTATION_ERROR', precision, 'ORIENTATION_ERROR', 0.0),
+    ('LINE_ERROR', precision, 'LINE_ERROR', 0.0),
+    ('PSEUDO_ANGLE_ERROR', polarsort, 'PSEUDO_ANGLE_ERROR', 0.0),
+    ('exact fallback', precision, 'exact_orientation', float_orientation),
+]
+
+
+def main():
+    scenes = test_scenes()
+    expected = expected_results(scenes)
+    failed = failures(scenes, expected)
+    for failure in failed: print 'FAILED', failure
+    print '%d scenes, %d offsets:' % (len(scenes),
+                                      len(OFFSETS + ROUNDED_OFFSETS)),
+    print 'ok' if not failed else '%d failures' % len(failed)
+
+    unguarded = []
+    for name, module, attribute, value in SAFEGUARDS:
+        caught = len(patched([(module, attribute, value)],
+                             failures, scenes, expected))
+        print 'without %s: %d failures' % (name, caught)
+        if not caught: unguarded.append(name)
+    for name in unguarded: print 'NOT GUARDED', name
+
+    if failed or unguarded: sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
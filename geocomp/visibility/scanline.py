@@ -2,41 +2,42 @@
 # -*- coding: utf-8 -*-
 
 import sys
+from collections import deque
+import numpy
 from bbstree import BalancedBinarySearchTree
 from graphic import GraphicAnimation
 from geometry import Point
 from geometry import LineSegment
+from spatial import hilbert_order
+from spatial import serpentine_order
+from scene import ray_hits
+from intervals import VisibleIntervals
+from sceneio import read_coordinates
+from polarsort import compare_polar_angles
+from polarsort import sort_by_polar_angle
+from predicates import compare_segments
 
 
 debug = False
 
+# Ray number of the interval extremes on the starting (+x) ray
+STARTING_RAY = -1
+
 class LineSegmentBalancedTree(BalancedBinarySearchTree):
     @staticmethod
-    def comparison_function(r, s):
+    def comparison_function(r, s, origin=None):
+        if origin is None: origin = LineSegment.origin
         if r.equals(s): return 0 # r = s
 
         # r and s are both segments in the scanline
-        if r.left_extreme.strictly_in_line_segment(
-                                LineSegment.origin, s.left_extreme):
-            return -1 # r < s
-        elif s.left_extreme.strictly_in_line_segment(
-                                LineSegment.origin, r.left_extreme):
-            return 1 # r > s
+        return compare_segments(origin.x, origin.y, r.line, s.line)
 
-        else:
-            if s.left_extreme.on_the_left_side(LineSegment.origin, r.left_extreme):
-                # r was inserted in the tree before s
-                if s.left_extreme.on_the_left_of(r):
-                    return 1 # r > s
-                else: return -1 # r < s
-            else: # s was inserted in the tree before r
-                if r.left_extreme.on_the_left_of(s):
-                    return -1 # r < s
-                else: return 1 # r > s
 
-
-    def __init__(self):
-        BalancedBinarySearchTree.__init__(self, LineSegmentBalancedTree.comparison_function)
+    def __init__(self, origin=None):
+        if origin is None: origin = LineSegment.origin
+        comparison_function = LineSegmentBalancedTree.comparison_function
+        BalancedBinarySearchTree.__init__(
+            self, lambda r, s: comparison_function(r, s, origin))
 
 
 
@@ -55,6 +56,12 @@ class VisibleSegments:
         self.visible_sections[point.index].append(point)
         self.visible_segments.append(point)
 
+    # Visible intervals as (segment index, start point, end point)
+    def intervals(self):
+        for index, entry in enumerate(self.visible_sections):
+            for k in range(0, len(entry), 2):
+                yield index, entry[k], entry[k + 1]
+
     def __repr__(self):
         res = ''
         i = 0
@@ -70,28 +77,72 @@ class VisibleSegments:
 
 
 
-def compare_polar_angles(point1, point2):
-    origin = LineSegment.origin
-    point1_quadrant = point1.relative_quadrant(origin)
-    point2_quadrant = point2.relative_quadrant(origin)
-    if point1_quadrant != point2_quadrant:
-        if point1_quadrant < point2_quadrant: return -1
-        else: return 1
-    else:
-        if point1.strictly_in_line_segment(origin, point2):
-            if not point1.is_left_extreme:
-                return 1
-            else: return -1
-        elif point2.strictly_in_line_segment(origin, point1):
-            if not point2.is_left_extreme:
-                return -1
-            else: return 1
-        else:
-            if point1.on_the_left_side(origin, point2): return 1
-            else: return -1
+# Interval extremes found by a sweep, recorded symbolically in the order the
+# intervals were opened and closed: the segment the extreme lies on and the
+# extreme 2k (left) or 2k + 1 (right) of segment k whose ray defines it, or
+# STARTING_RAY. Their coordinates are computed afterwards, all at once.
+class SweepEvents:
+    def __init__(self):
+        self.segments = []
+        self.rays = []
+        self.opening = []
+
+    def openVisibleInterval(self, segment, ray):
+        self.segments.append(segment)
+        self.rays.append(ray)
+        self.opening.append(True)
+
+    def closeVisibleInterval(self, segment, ray):
+        self.segments.append(segment)
+        self.rays.append(ray)
+        self.opening.append(False)
+
+    # VisibleSegments of the events, given the Point of each one
+    def visible_segments(self, segment_count, points):
+        result = VisibleSegments([[] for k in range(segment_count)])
+        for opening, point in zip(self.opening, points):
+            if opening: result.openVisibleInterval(point)
+            else: result.closeVisibleInterval(point)
+        return result
+
+    # The intervals as (segment, start ray, end ray), in the order of the rows
+    # of visible_intervals
+    def symbolic_intervals(self):
+        order = sorted(range(len(self.segments)), key=self.segments.__getitem__)
+        return [(self.segments[i], self.rays[i], self.rays[j])
+                for i, j in zip(order[0::2], order[1::2])]
+
+    # VisibleIntervals of the events, given their coordinates
+    def visible_intervals(self, segment_count, guard, xs, ys):
+        segment = numpy.array(self.segments, dtype=numpy.int64)
+        points = numpy.column_stack((xs, ys))
+        # the events of one segment alternate between opening and closing
+        order = numpy.argsort(segment, kind='mergesort')
+        segment = segment[order]
+        points = points[order]
+        return VisibleIntervals.from_arrays(segment_count, guard, segment[0::2],
+                                            points[0::2], points[1::2])
+
+
+# Same as SweepEvents, but keeps only the open intervals and the completed
+# ones, as (segment, start ray, end ray), that were not consumed yet
+class IntervalStream:
+    def __init__(self):
+        self.opened = {}
+        self.completed = deque()
 
+    def openVisibleInterval(self, segment, ray):
+        self.opened[segment] = ray
+
+    def closeVisibleInterval(self, segment, ray):
+        start = self.opened.pop(segment)
+        self.completed.append((segment, start, ray))
+
+
+
+def build_initial_tree(segments, sorted_extremes, origin=None):
+    if origin is None: origin = LineSegment.origin
 
-def build_initial_tree(segments, sorted_extremes):
     is_initial_segment = [True for each_element in segments]
     for extreme in sorted_extremes:
         if extreme.is_left_extreme:
@@ -100,62 +151,120 @@ def build_initial_tree(segments, sorted_extremes):
     initial_segments = [ segments[index] for index, present in
                         enumerate(is_initial_segment) if present  ]
 
-    tree = LineSegmentBalancedTree()
-    for segment in initial_segments: tree.insert(segment)
+    initial_segments.sort(
+        key=lambda segment: distance_along_starting_ray(segment, origin))
+
+    tree = LineSegmentBalancedTree(origin)
+    tree.load_sorted(initial_segments)
 
     return tree
 
 
-def intersection_point(p1, p2, p3, p4):
-    x = ((((p1.x*p2.y) - (p1.y*p2.x))*(p3.x-p4.x)) - ((p1.x-p2.x)*((p3.x*p4.y) - (p3.y*p4.x))))/ \
-            (((p1.x - p2.x)*(p3.y - p4.y)) - ((p1.y - p2.y)*(p3.x - p4.x)))
-    y = ((((p1.x*p2.y) - (p1.y*p2.x))*(p3.y-p4.y)) - ((p1.y-p2.y)*((p3.x*p4.y) - (p3.y*p4.x))))/ \
-            (((p1.x - p2.x)*(p3.y - p4.y)) - ((p1.y - p2.y)*(p3.x - p4.x)))
-    return Point(x, y)
+# Distance from the origin to the point where segment crosses the +x ray
+def distance_along_starting_ray(segment, origin):
+    p = segment.left_extreme
+    q = segment.right_extreme
+    if p.y == q.y: return min(p.x, q.x) - origin.x
+    return p.x + (origin.y - p.y) * (q.x - p.x) / (q.y - p.y) - origin.x
+
+
+# Extreme of segments numbered as in SweepEvents
+def extreme_point(segments, ray):
+    segment = segments[ray >> 1]
+    if ray & 1: return segment.right_extreme
+    else: return segment.left_extreme
+
+
+# Points of the symbolic events (segment, ray) of a sweep over segments. An
+# extreme of the segment itself is returned as is; the other points, where
+# the ray from origin meets the line of the segment, are computed in one
+# vectorized pass.
+def event_points(segments, origin, event_segments, rays):
+    extremes = [None if ray == STARTING_RAY else extreme_point(segments, ray)
+                for ray in rays]
+    lines = [segments[k] for k in event_segments]
+    xs, ys = ray_hits(origin.x, origin.y,
+                      numpy.array([0.0 if p is None else p.x for p in extremes]),
+                      numpy.array([0.0 if p is None else p.y for p in extremes]),
+                      numpy.array([p is None for p in extremes], dtype=bool),
+                      numpy.array([s.left_extreme.x for s in lines], dtype=float),
+                      numpy.array([s.left_extreme.y for s in lines], dtype=float),
+                      numpy.array([s.right_extreme.x for s in lines], dtype=float),
+                      numpy.array([s.right_extreme.y for s in lines], dtype=float))
+
+    points = []
+    for k, ray, extreme, x, y in zip(event_segments, rays, extremes,
+                                     xs.tolist(), ys.tolist()):
+        if extreme is not None and ray >> 1 == k:
+            points.append(extreme)
+        else:
+            p = Point(x, y)
+            p.set_segment_index(k)
+            points.append(p)
+    return points
 
 
-# Determines the visibility of a segment based on the case.
+# Determines the visibility of a segment based on the case. Segments are
+# given by their indices and the interval extremes are reported to results
+# symbolically, as described in SweepEvents.
 def determine_visibility(case, current, last, just_treated, results):
-    if last == None:
-        results.openVisibleInterval(current.left_extreme)
+    if last is None:
+        results.openVisibleInterval(current, 2 * current)
 
-    elif current == None:
-        results.closeVisibleInterval(last.right_extreme)
+    elif current is None:
+        results.closeVisibleInterval(last, 2 * last + 1)
 
-    elif current.index == just_treated:
+    elif current == just_treated:
         if case == 'insertion':
-            p = intersection_point(last.left_extreme, last.right_extreme, LineSegment.origin, current.left_extreme)
-            p.set_segment_index(last.index)
-            results.closeVisibleInterval(p)
-            results.openVisibleInterval(current.left_extreme)
+            results.closeVisibleInterval(last, 2 * current)
+            results.openVisibleInterval(current, 2 * current)
 
     else:
-        if (not current == last) and case == 'remotion':
-            results.closeVisibleInterval(last.right_extreme)
-            p = intersection_point(current.left_extreme, current.right_extreme, LineSegment.origin, last.right_extreme)
-            p.set_segment_index(current.index)
-            results.openVisibleInterval(p)
-
-
-# Scan line algorithm
-def scan_line_radar(segments, extremes):
-    sorted_extremes = sorted(extremes, cmp=compare_polar_angles)
-    scan_line = build_initial_tree(segments, sorted_extremes)
+        if current != last and case == 'remotion':
+            results.closeVisibleInterval(last, 2 * last + 1)
+            results.openVisibleInterval(current, 2 * last + 1)
+
+
+# Scan line algorithm. The origin defaults to the one set in LineSegment;
+# passing it explicitly makes the call independent of any shared state.
+def scan_line_radar(segments, extremes, origin=None):
+    if origin is None: origin = LineSegment.origin
+    events = SweepEvents()
+    for step in radar_sweep(segments, extremes, origin, events): pass
+    points = event_points(segments, origin, events.segments, events.rays)
+    return events.visible_segments(len(segments), points)
+
+
+# Same as scan_line_radar, but yields every visible interval, as (segment
+# index, start point, end point), as soon as it is closed
+def scan_line_radar_stream(segments, extremes, origin=None):
+    if origin is None: origin = LineSegment.origin
+    stream = IntervalStream()
+    for step in radar_sweep(segments, extremes, origin, stream):
+        while stream.completed:
+            k, start, end = stream.completed.popleft()
+            start, end = event_points(segments, origin, [k, k], [start, end])
+            yield k, start, end
+
+
+# The sweep itself, reporting the intervals to result as described in
+# SweepEvents. It yields after each event so that callers can consume the
+# intervals while it runs.
+def radar_sweep(segments, extremes, origin, result):
+    if origin is None: origin = LineSegment.origin
+    sorted_extremes = sort_by_polar_angle(extremes, origin)
+    scan_line = build_initial_tree(segments, sorted_extremes, origin)
 
-    results = [[] for each_element in segments]
-    result = VisibleSegments(results)
     last_visible = None
 
     if debug:
         for p in sorted_extremes: print p.index
 
-    initial_point = None
+    initial_segment = None
     current_visible = scan_line.min()
     if not (current_visible is None):
-        p_aux = Point(LineSegment.origin.x + 1, LineSegment.origin.y)
-        initial_point = intersection_point(current_visible.left_extreme, current_visible.right_extreme, LineSegment.origin, p_aux)
-        initial_point.set_segment_index(current_visible.index)
-        result.openVisibleInterval(initial_point)
+        initial_segment = current_visible.index
+        result.openVisibleInterval(initial_segment, STARTING_RAY)
         last_visible = current_visible
 
     for point in sorted_extremes:
@@ -175,39 +284,213 @@ def scan_line_radar(segments, extremes):
             if current_visible: print str(current_visible.index)
             else: print 'None'
 
-        determine_visibility(case, current_visible, last_visible, point.index, result)
+        determine_visibility(case, index_of(current_visible),
+                             index_of(last_visible), point.index, result)
 
         if debug: print '\n'
 
         last_visible = current_visible
+        yield
 
-    if not (initial_point is None):
-        result.closeVisibleInterval(initial_point)
+    if not (initial_segment is None):
+        result.closeVisibleInterval(initial_segment, STARTING_RAY)
+    yield
 
-    return result
 
+def index_of(segment):
+    return None if segment is None else segment.index
 
-def build_data_structures(entry):
-    x, y = entry.pop(0)
-    guard = Point(x, y)
-    LineSegment.set_origin(guard)
-
-    extremes = []
-    segments = []
-    while len(entry) > 0:
-        x, y = entry.pop(0)
+
+# Points of the symbolic events (segment, ray) of a sweep over view
+def view_points(view, segments, rays):
+    xs, ys = view.event_coordinates(segments, rays)
+    points = []
+    for k, x, y in zip(segments, xs.tolist(), ys.tolist()):
         p = Point(x, y)
+        p.set_segment_index(k)
+        points.append(p)
+    return points
+
+
+# Scan line algorithm over a preprocessed Scene, for the guard at (x, y)
+def scan_scene(scene, x, y):
+    view = scene.view(x, y)
+    events = SweepEvents()
+    for step in scene_sweep(view, events): pass
+    points = view_points(view, events.segments, events.rays)
+    return events.visible_segments(len(scene), points)
+
+
+# Same as scan_scene, but returns VisibleIntervals, never creating Points.
+# With max_range, only what lies within that distance of the guard is seen:
+# the scan runs over the segments near the guard, clipped to that range.
+def scan_scene_intervals(scene, x, y, max_range=None):
+    if max_range is not None:
+        nearby, indices = scene.within_range(x, y, max_range)
+        return scan_scene_intervals(nearby, x, y).renumbered(len(scene),
+                                                             indices)
+    return view_intervals(scene.view(x, y))
+
+
+# VisibleIntervals of a sweep over a GuardView
+def view_intervals(view):
+    events = SweepEvents()
+    for step in scene_sweep(view, events): pass
+    xs, ys = view.event_coordinates(events.segments, events.rays)
+    return events.visible_intervals(len(view.scene), (view.x, view.y), xs, ys)
+
+
+# Visibility along the rays from the guard (x, y) with polar angles from
+# start_angle counterclockwise to end_angle, in radians. Only the segments
+# that meet that sector are swept, and their intervals are cut to it.
+def scan_scene_sector(scene, x, y, start_angle, end_angle):
+    width = numpy.mod(end_angle - start_angle, 2 * numpy.pi)
+    if width == 0: width = 2 * numpy.pi
+    nearby, indices = scene.within_sector(x, y, start_angle, width)
+    result = scan_scene_intervals(nearby, x, y)
+    return result.within_sector((float(x), float(y)), start_angle, width,
+                                nearby.coordinates).renumbered(len(scene),
+                                                               indices)
+
+
+# Visible intervals of the target segments, given by their indices, from the
+# guard (x, y). Only the targets and the segments that may hide them are
+# swept; the result has no intervals for the other segments.
+def scan_scene_targets(scene, x, y, targets):
+    nearby, indices = scene.around_targets(x, y, targets)
+    result = scan_scene_intervals(nearby, x, y).renumbered(len(scene), indices)
+    return result.of_segments(targets)
+
+
+# Same as scan_scene, but yields every visible interval as soon as it is
+# closed, like scan_line_radar_stream
+def scan_scene_stream(scene, x, y):
+    view = scene.view(x, y)
+    stream = IntervalStream()
+    for step in scene_sweep(view, stream):
+        while stream.completed:
+            k, start, end = stream.completed.popleft()
+            start, end = view_points(view, [k, k], [start, end])
+            yield k, start, end
+
+
+# Same as radar_sweep, over a GuardView
+def scene_sweep(view, result):
+    scan_line = BalancedBinarySearchTree(view.compare_segments)
+    scan_line.load_sorted(view.initial_segments)
 
-        x, y = entry.pop(0)
-        q = Point(x, y)
+    last_visible = None
 
-        k = len(segments)
-        p.set_segment_index(k)
-        q.set_segment_index(k)
-        segments.append(LineSegment(p, q))
-        extremes.append(p)
-        extremes.append(q)
-    return (extremes, segments)
+    initial_segment = None
+    current_visible = scan_line.min()
+    if not (current_visible is None):
+        initial_segment = current_visible
+        result.openVisibleInterval(initial_segment, STARTING_RAY)
+        last_visible = current_visible
+
+    for event in view.events:
+        segment = event >> 1
+        if event & 1:
+            scan_line.remove(segment)
+            case = 'remotion'
+        else:
+            scan_line.insert(segment)
+            case = 'insertion'
+
+        current_visible = scan_line.min()
+        determine_visibility(case, current_visible, last_visible,
+                             segment, result)
+        last_visible = current_visible
+        yield
+
+    if not (initial_segment is None):
+        result.closeVisibleInterval(initial_segment, STARTING_RAY)
+    yield
+
+
+# Visibility from each of the guards (x, y) over the same preprocessed scene
+def scan_line_radar_batch(scene, guards):
+    results = []
+    for x, y in guards:
+        if scene.touches(x, y):
+            raise Exception('Guard must not lie on a segment')
+        results.append(scan_scene(scene, x, y))
+    return results
+
+
+# Same as scan_line_radar_batch, but visits the guards along a curve that
+# keeps consecutive guards close, 'hilbert' or 'serpentine', and starts the
+# polar order of each guard from that of the previous one. Returns the
+# VisibleIntervals of every guard, in the given order, and the inversions
+# repaired in the polar order of each one (None for the first one visited,
+# and for those too far from the previous one, whose order is sorted anew).
+def scan_line_radar_traversal(scene, guards, curve='hilbert'):
+    guards = numpy.asarray(guards, dtype=float).reshape(-1, 2)
+    if curve == 'hilbert': order = hilbert_order(guards[:, 0], guards[:, 1])
+    elif curve == 'serpentine':
+        order = serpentine_order(guards[:, 0], guards[:, 1])
+    else: raise Exception('Unknown curve ' + repr(curve))
+
+    results = [None] * len(guards)
+    inversions = [None] * len(guards)
+    events = None
+    for i in order.tolist():
+        x, y = guards[i]
+        if scene.touches(x, y):
+            raise Exception('Guard must not lie on a segment')
+        view = scene.view(x, y, events)
+        results[i] = view_intervals(view)
+        inversions[i] = view.repaired
+        events = view.order
+    return results, inversions
+
+
+# State of a single visibility query: the guard and the scene, whose
+# segments are oriented with respect to that guard. Queries do not share
+# any state, so several of them can run at the same time.
+class QueryContext(object):
+    def __init__(self, guard, segments, extremes):
+        self.guard = guard
+        self.segments = segments
+        self.extremes = extremes
+
+    # Builds the query from a list of pairs (x, y): the guard followed by the
+    # two extremes of every segment
+    @staticmethod
+    def from_entry(entry):
+        return QueryContext.from_coordinates(numpy.array(entry, dtype=float))
+
+    # Same as from_entry, for the coordinates given as one flat sequence
+    @staticmethod
+    def from_coordinates(coordinates):
+        coordinates = numpy.asarray(coordinates, dtype=float).ravel()
+        guard = Point(coordinates[0], coordinates[1])
+
+        extremes = []
+        segments = []
+        rows = coordinates[2:].reshape(-1, 4).tolist()
+        for index, (px, py, qx, qy) in enumerate(rows):
+            p = Point(px, py)
+            q = Point(qx, qy)
+            p.set_segment_index(index)
+            q.set_segment_index(index)
+            segments.append(LineSegment(p, q, guard))
+            extremes.append(p)
+            extremes.append(q)
+        return QueryContext(guard, segments, extremes)
+
+    def scan(self):
+        return scan_line_radar(self.segments, self.extremes, self.guard)
+
+    def scan_intervals(self):
+        return VisibleIntervals.from_visible_segments(
+            self.scan(), (self.guard.x, self.guard.y))
+
+
+def build_data_structures(entry):
+    context = QueryContext.from_entry(entry)
+    LineSegment.set_origin(context.guard)
+    return (context.extremes, context.segments)
 
 
 # Algorithm called by the graphical interface
@@ -217,26 +500,21 @@ def radar_scan(input_list):
         entry.append((segment.init.x, segment.init.y))
         entry.append((segment.to.x, segment.to.y))
 
-    extremes, segments = build_data_structures(entry)
+    context = QueryContext.from_entry(entry)
 
-    guarded_walls = scan_line_radar(segments, extremes).visible_segments
+    guarded_walls = context.scan().visible_segments
     print guarded_walls
-    GraphicAnimation(LineSegment.origin, guarded_walls).draw_animation()
+    GraphicAnimation(context.guard, guarded_walls).draw_animation()
 
 
 # Solves the problem when entry is read from standard output
 def main():
-    input_list = sys.stdin.read().split()
-    if len(input_list) % 4 != 2:
+    coordinates = read_coordinates(sys.stdin)
+    if len(coordinates) % 4 != 2:
         raise Exception('Invalid input')
 
-    entry = []
-    while len(input_list) > 0:
-        entry.append((input_list.pop(0), input_list.pop(0)))
-
-    extremes, segments = build_data_structures(entry)
+    context = QueryContext.from_coordinates(coordinates)
 
-    guard = LineSegment.origin
-    print 'Visible segments from', guard, '\n'
-    guarded_walls = scan_line_radar(segments, extremes)
+    print 'Visible segments from', context.guard, '\n'
+    guarded_walls = context.scan()
     print guarded_walls
\ No newline at end of file
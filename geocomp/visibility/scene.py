@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import numpy
+from precision import is_integral
+from precision import orientations
+from predicates import compare_polar
+from predicates import compare_segments
+from polarsort import exact_polar_order
+from polarsort import polar_keys
+from polarsort import polar_order
+from polarsort import repair_polar_order
+from polarsort import resolve_ties
+from sceneio import map_scene
+from spatial import SegmentGrid
+from spatial import clip_to_disk
+from spatial import angular_spans
+from spatial import distance_range
+from spatial import meet_sector
+
+
+# Guard independent description of a set of walls. Segment k goes from
+# (x0[k], y0[k]) to (x1[k], y1[k]) and lies on the line a x + b y + c = 0.
+# When every coordinate is a small integer they are also kept as integers.
+# Only the coordinates are held from the start, so a mapped scene file is
+# not read or copied; every array derived from them is built on first use.
+class Scene(object):
+    def __init__(self, coordinates):
+        self.coordinates = numpy.asarray(coordinates, dtype=float).reshape(-1, 4)
+        self.x0 = self.coordinates[:, 0]
+        self.y0 = self.coordinates[:, 1]
+        self.x1 = self.coordinates[:, 2]
+        self.y1 = self.coordinates[:, 3]
+        self.digest = None
+        self.grid = None
+        self.boxes = None
+        self.integral = None
+
+    @property
+    def bounding_boxes(self):
+        if self.boxes is None:
+            self.boxes = numpy.column_stack((
+                numpy.minimum(self.x0, self.x1), numpy.minimum(self.y0, self.y1),
+                numpy.maximum(self.x0, self.x1), numpy.maximum(self.y0, self.y1)))
+        return self.boxes
+
+    # The coordinates as int64, or None unless they are all small integers
+    @property
+    def integers(self):
+        if self.integral is None:
+            self.integral = is_integral(self.coordinates)
+            if self.integral:
+                self.integral_coordinates = self.coordinates.astype(numpy.int64)
+        return self.integral_coordinates if self.integral else None
+
+    def __len__(self):
+        return len(self.coordinates)
+
+    # Builds a scene from a list of extremes (x, y), two per segment
+    @staticmethod
+    def from_points(points):
+        return Scene(numpy.array(points, dtype=float))
+
+    # Loads a binary scene file (see sceneio) without copying its segments.
+    # Returns the guard stored in the file and the scene.
+    @staticmethod
+    def load(filename):
+        guard, coordinates = map_scene(filename)
+        return guard, Scene(coordinates)
+
+    # Builds a scene from LineSegment objects, keeping their indices
+    @staticmethod
+    def from_segments(segments):
+        return Scene([(s.left_extreme.x, s.left_extreme.y,
+                       s.right_extreme.x, s.right_extreme.y) for s in segments])
+
+    # Tells whether the point (x, y) lies on one of the segments
+    def touches(self, x, y):
+        candidates = self.segment_grid().query(x, y, x, y)
+        sides = orientations(x, y, self.x0[candidates], self.y0[candidates],
+                             self.x1[candidates], self.y1[candidates])
+        return bool((sides == 0).any())
+
+    # Content hash of the segments, computed once
+    def fingerprint(self):
+        if self.digest is None:
+            coordinates = numpy.ascontiguousarray(self.coordinates, dtype='<f8')
+            self.digest = hashlib.sha1(coordinates.tobytes()).hexdigest()
+        return self.digest
+
+    # Uniform grid over the bounding boxes of the segments, built once
+    def segment_grid(self):
+        if self.grid is None: self.grid = SegmentGrid(self.bounding_boxes)
+        return self.grid
+
+    # The segments within distance radius of (x, y), clipped to that disk, as
+    # a Scene, along with the indices they have in this scene
+    def within_range(self, x, y, radius):
+        candidates = self.segment_grid().query(x - radius, y - radius,
+                                               x + radius, y + radius)
+        kept, clipped = clip_to_disk(self.coordinates[candidates], x, y, radius)
+        return Scene(clipped), candidates[kept]
+
+    # The segments that meet the sector of the rays from (x, y) with polar
+    # angles from start to start + width, as a Scene, along with the indices
+    # they have in this scene
+    def within_sector(self, x, y, start, width):
+        candidates = self.segment_grid().query_sector(x, y, start, width)
+        indices = candidates[meet_sector(self.coordinates[candidates],
+                                         x, y, start, width)]
+        return Scene(self.coordinates[indices]), indices
+
+    # The targets, given by their indices, and the segments that may hide part
+    # of them from (x, y), as a Scene, along with the indices they have in this
+    # scene. Those segments meet the triangle between (x, y) and a target, so
+    # they meet its arc and come nearer to (x, y) than its farthest point.
+    def around_targets(self, x, y, targets):
+        targets = numpy.unique(numpy.asarray(targets, dtype=int))
+        grid = self.segment_grid()
+        coordinates = self.coordinates[targets]
+        low, span = angular_spans(coordinates, x, y)
+        farthest = distance_range(coordinates, x, y)[1]
+
+        parts = [targets]
+        for k, (px, py, qx, qy) in enumerate(coordinates.tolist()):
+            candidates = grid.query(min(x, px, qx), min(y, py, qy),
+                                    max(x, px, qx), max(y, py, qy))
+            candidates = candidates[meet_sector(self.coordinates[candidates],
+                                                x, y, low[k], span[k])]
+            nearest = distance_range(self.coordinates[candidates], x, y)[0]
+            parts.append(candidates[nearest < farthest[k]])
+        indices = numpy.unique(numpy.concatenate(parts))
+        return Scene(self.coordinates[indices]), indices
+
+    def view(self, x, y, previous_events=None, hidden=None):
+        return GuardView(self, x, y, previous_events, hidden)
+
+
+# A scene as seen from the guard (x, y): the left and right extremes of every
+# segment, as LineSegment orients them, and the polar order of the extremes,
+# as an array (order) and as a list (events).
+# Extreme 2k is the left extreme of segment k and 2k + 1 its right extreme.
+# An integer guard in an integer scene is exact: its coordinates and extremes
+# are integers, so every predicate is computed in integer arithmetic. Given
+# the events of a nearby guard, the polar order starts from them and only the
+# extremes out of order are moved; repaired counts the inversions fixed. When
+# too many are out of order the extremes are sorted anew, and repaired is
+# None, as without previous events. The segments set in the boolean array
+# hidden are left out of the polar order, so a sweep passes over them as if
+# they were not in the scene, which keeps the indices of the others. The
+# previous events may come from a view that hid other segments.
+class GuardView(object):
+    def __init__(self, scene, x, y, previous_events=None, hidden=None):
+        self.scene = scene
+        self.exact = scene.integers is not None and is_integral((x, y))
+        if self.exact:
+            x0, y0, x1, y1 = scene.integers.T
+            self.x = x = int(x)
+            self.y = y = int(y)
+        else:
+            x0, y0, x1, y1 = scene.x0, scene.y0, scene.x1, scene.y1
+            self.x = x = float(x)
+            self.y = y = float(y)
+
+        left_first = orientations(x, y, x0, y0, x1, y1) > 0
+        left_x = numpy.where(left_first, x0, x1)
+        left_y = numpy.where(left_first, y0, y1)
+        right_x = numpy.where(left_first, x1, x0)
+        right_y = numpy.where(left_first, y1, y0)
+        self.left_x = left_x.tolist()
+        self.left_y = left_y.tolist()
+        self.right_x = right_x.tolist()
+        self.right_y = right_y.tolist()
+
+        # lines oriented from the left to the right extreme, positive on the
+        # side of the guard
+        a = left_y - right_y
+        b = right_x - left_x
+        c = left_x * right_y - right_x * left_y
+        magnitude = numpy.abs(left_x * right_y) + numpy.abs(right_x * left_y)
+        self.line_records = zip(self.left_x, self.left_y,
+                                self.right_x, self.right_y, a.tolist(),
+                                b.tolist(), c.tolist(), magnitude.tolist())
+
+        n = len(scene)
+        extremes_x = numpy.empty(2 * n, dtype=left_x.dtype)
+        extremes_x[0::2] = left_x
+        extremes_x[1::2] = right_x
+        extremes_y = numpy.empty(2 * n, dtype=left_y.dtype)
+        extremes_y[0::2] = left_y
+        extremes_y[1::2] = right_y
+        is_left = numpy.zeros(2 * n, dtype=bool)
+        is_left[0::2] = True
+        shown = numpy.ones(2 * n, dtype=bool)
+        if hidden is not None: shown[:] = ~numpy.repeat(hidden, 2)
+
+        self.extremes = numpy.column_stack((extremes_x, extremes_y)).astype(float)
+        self.extremes_x = extremes_x.tolist()
+        self.extremes_y = extremes_y.tolist()
+        self.order = self.repaired = None
+        if previous_events is not None:
+            # the extremes hidden now leave the previous events, and those
+            # hidden before are added at their end, from where the repair
+            # moves them into place
+            previous = numpy.asarray(previous_events, dtype=numpy.intp)
+            listed = numpy.zeros(2 * n, dtype=bool)
+            listed[previous] = True
+            previous = numpy.concatenate((previous[shown[previous]],
+                                          numpy.flatnonzero(shown & ~listed)))
+            quadrant, pseudo_angle = polar_keys(extremes_x - x, extremes_y - y,
+                                                is_left)[:2]
+            self.order, self.repaired = repair_polar_order(
+                previous, quadrant, pseudo_angle, self.compare_extremes)
+        if self.order is None:
+            sort = exact_polar_order if self.exact else polar_order
+            extremes = numpy.flatnonzero(shown)
+            order, tied = sort(extremes_x[extremes] - x,
+                               extremes_y[extremes] - y, is_left[extremes])
+            self.order = resolve_ties(extremes[order], tied,
+                                      self.compare_extremes)
+        self.events = self.order.tolist()
+
+        # segments whose right extreme comes first cross the starting ray
+        rank = numpy.zeros(2 * n, dtype=int)
+        rank[self.order] = numpy.arange(len(self.order))
+        initial = numpy.flatnonzero(rank[1::2] < rank[0::2])
+        left_x, left_y, right_x, right_y, x, y = [numpy.asarray(
+            v, dtype=float) for v in (left_x, left_y, right_x, right_y, x, y)]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            distance = numpy.where(
+                left_y[initial] == right_y[initial],
+                numpy.minimum(left_x[initial], right_x[initial]) - x,
+                left_x[initial] + (y - left_y[initial]) *
+                (right_x[initial] - left_x[initial]) /
+                (right_y[initial] - left_y[initial]) - x)
+        self.initial_segments = \
+            initial[numpy.argsort(distance, kind='mergesort')].tolist()
+
+    # Coordinates of the symbolic interval extremes (segment, ray) recorded by
+    # a sweep (see scanline.SweepEvents), computed all at once
+    def event_coordinates(self, segments, rays):
+        segments = numpy.asarray(segments, dtype=int)
+        rays = numpy.asarray(rays, dtype=int)
+        starting = rays < 0
+        extremes = self.extremes[numpy.where(starting, 0, rays)]
+        left = self.extremes[2 * segments]
+        right = self.extremes[2 * segments + 1]
+        xs, ys = ray_hits(self.x, self.y, extremes[:, 0], extremes[:, 1],
+                          starting, left[:, 0], left[:, 1],
+                          right[:, 0], right[:, 1])
+        own = (rays >> 1) == segments
+        # the hits on the starting ray are put exactly on it, so that their
+        # polar angles are 0 and not 2pi, as rounding may leave them
+        on_starting_ray = starting | ((extremes[:, 1] == self.y) &
+                                      (extremes[:, 0] > self.x))
+        return (numpy.where(own, extremes[:, 0], xs),
+                numpy.where(own, extremes[:, 1],
+                            numpy.where(on_starting_ray, self.y, ys)))
+
+    # Same as compare_polar_angles, for extremes given by their numbers
+    def compare_extremes(self, e, f):
+        return compare_polar(self.x, self.y,
+                             self.extremes_x[e], self.extremes_y[e], not e & 1,
+                             self.extremes_x[f], self.extremes_y[f], not f & 1)
+
+    # Same as LineSegmentBalancedTree.comparison_function, for segments given
+    # by their indices
+    def compare_segments(self, r, s):
+        if r == s: return 0
+        return compare_segments(self.x, self.y,
+                                self.line_records[r], self.line_records[s])
+
+
+# Points where the rays from (x, y) through the points (ray_x, ray_y), or
+# along +x where starting is set, meet the lines through (left_x, left_y) and
+# (right_x, right_y). Works on arrays, one ray and line per entry, and uses
+# the determinant formula of the original intersection_point, operation for
+# operation, so the points are the same to the last bit.
+def ray_hits(x, y, ray_x, ray_y, starting, left_x, left_y, right_x, right_y):
+    ray_x = numpy.where(starting, x + 1.0, ray_x)
+    ray_y = numpy.where(starting, y, ray_y)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        segment_cross = left_x * right_y - left_y * right_x
+        ray_cross = x * ray_y - y * ray_x
+        denominator = ((left_x - right_x) * (y - ray_y) -
+                       (left_y - right_y) * (x - ray_x))
+        return ((segment_cross * (x - ray_x) -
+                 (left_x - right_x) * ray_cross) / denominator,
+                (segment_cross * (y - ray_y) -
+                 (left_y - right_y) * ray_cross) / denominator)
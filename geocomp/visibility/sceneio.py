@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+import numpy
+
+
+# Reads all whitespace separated numbers of a text stream into a flat float
+# array. The text is consumed in chunks, so only one chunk of it is held in
+# memory at a time besides the numbers already parsed.
+def read_coordinates(stream, chunk_size=1 << 20):
+    parts = []
+    tail = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk: break
+
+        text = tail + chunk
+        tokens = text.split()
+        # the last token may continue in the next chunk
+        if tokens and not text[-1].isspace(): tail = tokens.pop()
+        else: tail = ''
+        if tokens: parts.append(numpy.array(tokens, dtype=float))
+
+    if tail: parts.append(numpy.array([tail], dtype=float))
+    if not parts: return numpy.zeros(0)
+    return numpy.concatenate(parts)
+
+
+# Binary scene files start with a 64 bytes header: the magic string, the
+# number of segments, the guard and the bounding box of the segments. Then
+# come the segments, four little endian doubles each (x0, y0, x1, y1).
+MAGIC = 'RADARSC1'
+HEADER = numpy.dtype([('magic', 'S8'), ('count', '<i8'),
+                      ('guard', '<f8', (2,)), ('bounding_box', '<f8', (4,))])
+
+
+def write_scene(filename, guard, coordinates):
+    coordinates = numpy.asarray(coordinates, dtype='<f8').reshape(-1, 4)
+    header = numpy.zeros(1, dtype=HEADER)
+    header['magic'] = MAGIC
+    header['count'] = len(coordinates)
+    header['guard'] = guard
+    if len(coordinates) > 0:
+        x = coordinates[:, 0::2]
+        y = coordinates[:, 1::2]
+        header['bounding_box'] = (x.min(), y.min(), x.max(), y.max())
+
+    f = open(filename, 'wb')
+    try:
+        header.tofile(f)
+        coordinates.tofile(f)
+    finally:
+        f.close()
+
+
+def read_header(filename):
+    header = numpy.fromfile(filename, dtype=HEADER, count=1)
+    if len(header) == 0 or header['magic'][0] != MAGIC:
+        raise Exception('Not a binary scene file: ' + filename)
+    return header[0]
+
+
+# Maps a binary scene file into memory. Returns the guard (x, y) and an
+# (n, 4) array of the segments that reads straight from the file.
+def map_scene(filename):
+    header = read_header(filename)
+    count = int(header['count'])
+    guard = tuple(header['guard'].tolist())
+    if count == 0: return guard, numpy.zeros((0, 4))
+    data = numpy.memmap(filename, dtype='<f8', mode='r',
+                        offset=HEADER.itemsize, shape=(count, 4))
+    return guard, numpy.asarray(data)
+
+
+# Converts a text entry (guard followed by the segments, as read by main) to
+# the binary format
+def convert_text_scene(text_filename, binary_filename):
+    f = open(text_filename, 'r')
+    try:
+        coordinates = read_coordinates(f)
+    finally:
+        f.close()
+    if len(coordinates) % 4 != 2:
+        raise Exception('Invalid input: ' + text_filename)
+    write_scene(binary_filename, coordinates[:2], coordinates[2:])
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) != 3:
+        print 'usage:', sys.argv[0], '<text entry> <binary scene>'
+        sys.exit(1)
+    convert_text_scene(sys.argv[1], sys.argv[2])
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+
+import numpy
+
+
+# Order that visits the points (x, y) row by row, rows being the distinct
+# values of y, going along x in alternate directions
+def serpentine_order(x, y):
+    x = numpy.asarray(x, dtype=float)
+    row = numpy.unique(numpy.asarray(y, dtype=float), return_inverse=True)[1]
+    return numpy.lexsort((numpy.where(row % 2 == 1, -x, x), row))
+
+
+# Order of the points (x, y) along a Hilbert curve over their bounding box,
+# divided into 2 ** bits cells a side
+def hilbert_order(x, y, bits=16):
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+    side = 2 ** bits
+    extent = max(numpy.ptp(x) if len(x) else 0, numpy.ptp(y) if len(y) else 0)
+    if extent == 0: return numpy.arange(len(x))
+    u = numpy.minimum((x - x.min()) / extent * side, side - 1).astype(numpy.int64)
+    v = numpy.minimum((y - y.min()) / extent * side, side - 1).astype(numpy.int64)
+
+    distance = numpy.zeros(len(x), dtype=numpy.int64)
+    s = side // 2
+    while s > 0:
+        ru = (u & s) > 0
+        rv = (v & s) > 0
+        distance += s * s * ((3 * ru) ^ rv)
+        # rotates the quadrant so that the curve inside it is the standard one
+        flip = ~rv & ru
+        u = numpy.where(flip, side - 1 - u, u)
+        v = numpy.where(flip, side - 1 - v, v)
+        swap = ~rv
+        u, v = numpy.where(swap, v, u), numpy.where(swap, u, v)
+        s //= 2
+    return numpy.argsort(distance, kind='mergesort')
+
+
+# Uniform grid over the bounding boxes of a set of segments. Every cell lists
+# the segments whose bounding box meets it, cells being numbered row by row;
+# the lists are stored back to back in members, cell k owning
+# members[offsets[k]:offsets[k + 1]].
+class SegmentGrid(object):
+    def __init__(self, bounding_boxes, cell_size=None):
+        self.bounding_boxes = boxes = numpy.asarray(bounding_boxes, dtype=float)
+        n = len(boxes)
+        if n == 0:
+            self.origin = (0.0, 0.0)
+            self.bounds = (0.0, 0.0, 0.0, 0.0)
+            self.cell_size = 1.0
+            self.columns = self.rows = 0
+            self.members = numpy.zeros(0, dtype=int)
+            self.offsets = numpy.zeros(1, dtype=int)
+            return
+
+        low = boxes[:, :2].min(axis=0)
+        high = boxes[:, 2:].max(axis=0)
+        if cell_size is None:
+            # about as large as a segment, and a few segments per cell
+            extent = high - low
+            diagonal = numpy.hypot(boxes[:, 2] - boxes[:, 0],
+                                   boxes[:, 3] - boxes[:, 1]).mean()
+            cell_size = max(diagonal, numpy.sqrt(extent[0] * extent[1] / n))
+            if not cell_size > 0: cell_size = max(extent.max(), 1.0)
+        self.origin = (low[0], low[1])
+        self.bounds = (low[0], low[1], high[0], high[1])
+        self.cell_size = cell_size
+        self.columns = int((high[0] - low[0]) // cell_size) + 1
+        self.rows = int((high[1] - low[1]) // cell_size) + 1
+
+        column0, row0 = self.cell_of(boxes[:, 0], boxes[:, 1])
+        column1, row1 = self.cell_of(boxes[:, 2], boxes[:, 3])
+        width = column1 - column0 + 1
+        counts = width * (row1 - row0 + 1)
+
+        # one entry per segment and cell it meets
+        segment = numpy.repeat(numpy.arange(n), counts)
+        local = numpy.arange(counts.sum()) - \
+                numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        cell = (row0[segment] + local // width[segment]) * self.columns + \
+               column0[segment] + local % width[segment]
+
+        order = numpy.argsort(cell, kind='mergesort')
+        self.members = segment[order]
+        self.offsets = numpy.searchsorted(cell[order],
+                                          numpy.arange(self.columns * self.rows + 1))
+
+    def cell_of(self, x, y):
+        column = numpy.floor((numpy.asarray(x) - self.origin[0]) / self.cell_size)
+        row = numpy.floor((numpy.asarray(y) - self.origin[1]) / self.cell_size)
+        return (numpy.clip(column, 0, self.columns - 1).astype(int),
+                numpy.clip(row, 0, self.rows - 1).astype(int))
+
+    # Sorted indices of the segments whose bounding box meets the rectangle
+    def query(self, x0, y0, x1, y1):
+        low_x, low_y, high_x, high_y = self.bounds
+        if self.columns == 0 or x1 < low_x or x0 > high_x or \
+           y1 < low_y or y0 > high_y:
+            return numpy.zeros(0, dtype=int)
+
+        column0, row0 = self.cell_of(x0, y0)
+        column1, row1 = self.cell_of(x1, y1)
+        parts = []
+        for row in range(row0, row1 + 1):
+            first = row * self.columns
+            parts.append(self.members[self.offsets[first + column0]:
+                                      self.offsets[first + column1 + 1]])
+        candidates = numpy.unique(numpy.concatenate(parts))
+        box = self.bounding_boxes[candidates]
+        return candidates[(box[:, 0] <= x1) & (box[:, 2] >= x0) &
+                          (box[:, 1] <= y1) & (box[:, 3] >= y0)]
+
+    # Sorted indices of the segments in the cells that meet the sector of the
+    # rays from (x, y) with polar angles from start to start + width. Those
+    # include every segment that meets the sector.
+    def query_sector(self, x, y, start, width):
+        if self.columns == 0: return numpy.zeros(0, dtype=int)
+        if width > numpy.pi:
+            half = width / 2
+            return numpy.union1d(self.query_sector(x, y, start, half),
+                                 self.query_sector(x, y, start + half,
+                                                   width - half))
+        polygon = sector_polygon(x, y, start, width, self.bounds)
+        if len(polygon) == 0: return numpy.zeros(0, dtype=int)
+
+        # span of the polygon along each line between two rows of cells,
+        # then along each row, where it may also have vertices
+        boundaries = self.origin[1] + self.cell_size * numpy.arange(self.rows + 1)
+        left = numpy.empty(self.rows + 1)
+        left.fill(numpy.inf)
+        right = -left
+        for (px, py), (qx, qy) in zip(polygon, polygon[1:] + polygon[:1]):
+            if py == qy: continue
+            t = (boundaries - py) / (qy - py)
+            on_edge = (t >= 0) & (t <= 1)
+            hit = px + t[on_edge] * (qx - px)
+            left[on_edge] = numpy.minimum(left[on_edge], hit)
+            right[on_edge] = numpy.maximum(right[on_edge], hit)
+        left = numpy.minimum(left[:-1], left[1:])
+        right = numpy.maximum(right[:-1], right[1:])
+        vertex_x, vertex_y = numpy.array(polygon).T
+        vertex_row = self.cell_of(vertex_x, vertex_y)[1]
+        numpy.minimum.at(left, vertex_row, vertex_x)
+        numpy.maximum.at(right, vertex_row, vertex_x)
+
+        rows = numpy.flatnonzero(left <= right)
+        # one more cell on each side, against rounding
+        column0 = numpy.maximum(self.cell_of(left[rows], 0.0)[0] - 1, 0)
+        column1 = numpy.minimum(self.cell_of(right[rows], 0.0)[0] + 1,
+                                self.columns - 1)
+        parts = [numpy.zeros(0, dtype=int)]
+        for row, first, last in zip(rows.tolist(), column0.tolist(),
+                                    column1.tolist()):
+            row *= self.columns
+            parts.append(self.members[self.offsets[row + first]:
+                                      self.offsets[row + last + 1]])
+        return numpy.unique(numpy.concatenate(parts))
+
+
+# Convex polygon, as a list of vertices, of the points of the rectangle
+# bounds = (x0, y0, x1, y1) in the sector of the rays from (x, y) with polar
+# angles from start to start + width, for a width up to pi. The sector is
+# slightly widened, as in meet_sector, and cut far enough to cover bounds.
+def sector_polygon(x, y, start, width, bounds):
+    x0, y0, x1, y1 = bounds
+    margin = 1e-9
+    radius = 2 * numpy.hypot(max(abs(x - x0), abs(x - x1)),
+                             max(abs(y - y0), abs(y - y1))) + 1.0
+    # the chords between these rays stay outside the circle of that radius
+    radius /= numpy.cos(width / 4 + margin)
+    polygon = [(x, y)]
+    for angle in (start - margin, start + width / 2, start + width + margin):
+        polygon.append((x + radius * numpy.cos(angle),
+                        y + radius * numpy.sin(angle)))
+    for axis, value, below in ((0, x0, False), (0, x1, True),
+                               (1, y0, False), (1, y1, True)):
+        polygon = clip_polygon(polygon, axis, value, below)
+    return polygon
+
+
+# Part of a convex polygon on one side of the line where coordinate axis is
+# value: below it, or above it
+def clip_polygon(polygon, axis, value, below):
+    def inside(p): return p[axis] <= value if below else p[axis] >= value
+    clipped = []
+    for p, q in zip(polygon, polygon[1:] + polygon[:1]):
+        if inside(p): clipped.append(p)
+        if inside(p) != inside(q):
+            t = (value - p[axis]) / (q[axis] - p[axis])
+            clipped.append((p[0] + t * (q[0] - p[0]), p[1] + t * (q[1] - p[1])))
+    return clipped
+
+
+# Arcs along which (x, y) sees the segments, given as an (n, 4) array of
+# coordinates: the polar angle where each arc starts and its width, below pi
+def angular_spans(coordinates, x, y):
+    angle0 = numpy.arctan2(coordinates[:, 1] - y, coordinates[:, 0] - x)
+    angle1 = numpy.arctan2(coordinates[:, 3] - y, coordinates[:, 2] - x)
+    span = numpy.mod(angle1 - angle0, 2 * numpy.pi)
+    reversed = span > numpy.pi
+    return (numpy.where(reversed, angle1, angle0),
+            numpy.where(reversed, 2 * numpy.pi - span, span))
+
+
+# Distances from (x, y) to the nearest and to the farthest point of each of
+# the segments
+def distance_range(coordinates, x, y):
+    p = coordinates[:, :2] - (x, y)
+    q = coordinates[:, 2:] - (x, y)
+    d = q - p
+    length = (d * d).sum(axis=1)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        t = numpy.clip(-(p * d).sum(axis=1) / length, 0.0, 1.0)
+    t[length == 0] = 0.0
+    nearest = numpy.hypot(p[:, 0] + t * d[:, 0], p[:, 1] + t * d[:, 1])
+    farthest = numpy.maximum(numpy.hypot(p[:, 0], p[:, 1]),
+                             numpy.hypot(q[:, 0], q[:, 1]))
+    return nearest, farthest
+
+
+# Indices of the segments, given as an (n, 4) array of coordinates, that
+# meet the sector of the rays from (x, y) with polar angles from start to
+# start + width. The sector is slightly widened, so that rounding only adds
+# candidates.
+def meet_sector(coordinates, x, y, start, width):
+    low, span = angular_spans(coordinates, x, y)
+    margin = 1e-9
+    offset = numpy.mod(low - (start - margin), 2 * numpy.pi)
+    return numpy.flatnonzero((offset <= width + 2 * margin) |
+                             (offset + span >= 2 * numpy.pi))
+
+
+# Clips the segments, given as an (n, 4) array of coordinates, to the disk of
+# the given radius around (x, y). Returns the indices of the segments that
+# meet the disk along more than one point, and their clipped coordinates.
+# Extremes inside the disk are kept as they are.
+def clip_to_disk(coordinates, x, y, radius):
+    p = coordinates[:, :2] - (x, y)
+    d = coordinates[:, 2:] - coordinates[:, :2]
+    a = (d * d).sum(axis=1)
+    b = 2 * (p * d).sum(axis=1)
+    c = (p * p).sum(axis=1) - radius * radius
+    discriminant = b * b - 4 * a * c
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        root = numpy.sqrt(discriminant)
+        t0 = numpy.maximum((-b - root) / (2 * a), 0.0)
+        t1 = numpy.minimum((-b + root) / (2 * a), 1.0)
+        kept = numpy.flatnonzero((discriminant > 0) & (t0 < t1))
+
+    clipped = coordinates[kept].copy()
+    start_outside = c[kept] > 0
+    end_outside = ((coordinates[kept, 2:] - (x, y)) ** 2).sum(axis=1) > \
+                  radius * radius
+    start = coordinates[kept, :2] + t0[kept, None] * d[kept]
+    end = coordinates[kept, :2] + t1[kept, None] * d[kept]
+    clipped[start_outside, :2] = start[start_outside]
+    clipped[end_outside, 2:] = end[end_outside]
+    return kept, clipped
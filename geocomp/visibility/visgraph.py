@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+import os
+import numpy
+from scanline import view_intervals
+from spatial import hilbert_order
+
+
+# Visibility graph among the extremes of the segments of a scene. Vertex 2k
+# is (x0, y0) of segment k and vertex 2k + 1 is (x1, y1). The edges are kept
+# in compressed sparse rows: the neighbours of vertex v are
+# indices[indptr[v]:indptr[v + 1]], in increasing order, and weights holds
+# the length of each edge.
+class VisibilityGraph(object):
+    def __init__(self, vertices, indptr, indices, weights):
+        self.vertices = vertices
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+
+    def __len__(self):
+        return len(self.vertices)
+
+    def neighbors(self, v):
+        return self.indices[self.indptr[v]:self.indptr[v + 1]]
+
+    def edge_weights(self, v):
+        return self.weights[self.indptr[v]:self.indptr[v + 1]]
+
+    # Scans the scene from every vertex, hiding the segments that end there.
+    # The vertices seen are those that bound a visible interval; the other
+    # extremes of the segments ending at a vertex are always its neighbours.
+    # A vertex seen only past another vertex on the same line of sight is
+    # left to be reached through that one, which keeps path lengths. Every
+    # edge is found from its lower end, so each vertex only looks at the
+    # vertices not below it, and the segments below it are hidden as well.
+    # The vertices are visited along a Hilbert curve, and the polar order of
+    # each one starts from that of the previous one (see GuardView).
+    @staticmethod
+    def build(scene):
+        vertices = scene.coordinates.reshape(-1, 2)
+        finder = VertexFinder(vertices)
+        sources = []
+        targets = []
+        events = None
+        for v in hilbert_order(vertices[:, 0], vertices[:, 1]).tolist():
+            neighbors, events = visible_vertices(scene, vertices, finder, v,
+                                                 events)
+            sources.append(numpy.repeat(v, len(neighbors)))
+            targets.append(neighbors)
+        if vertices.size:
+            sources = numpy.concatenate(sources)
+            targets = numpy.concatenate(targets)
+        else:
+            sources = targets = numpy.zeros(0, dtype=numpy.int64)
+
+        # an edge seen from either end is kept both ways
+        edges = numpy.unique(numpy.concatenate((
+            sources * len(vertices) + targets,
+            targets * len(vertices) + sources)))
+        sources = edges // max(len(vertices), 1)
+        targets = edges % max(len(vertices), 1)
+        indptr = numpy.searchsorted(sources, numpy.arange(len(vertices) + 1))
+        weights = numpy.hypot(*(vertices[targets] - vertices[sources]).T)
+        return VisibilityGraph(vertices, indptr.astype(numpy.int64),
+                               targets.astype(numpy.int64), weights)
+
+    # Graph of the scene from the cache directory, where it is stored under
+    # the fingerprint of the scene. Cached arrays are memory mapped, not
+    # read; a graph not cached yet is built and stored.
+    @staticmethod
+    def load(scene, directory):
+        prefix = os.path.join(directory, scene.fingerprint())
+        try:
+            arrays = [numpy.load(prefix + '.' + name + '.npy', mmap_mode='r')
+                      for name in GRAPH_ARRAYS]
+        except IOError:
+            graph = VisibilityGraph.build(scene)
+            graph.save(directory, scene.fingerprint())
+            return graph
+        return VisibilityGraph(scene.coordinates.reshape(-1, 2), *arrays)
+
+    # Stores the arrays, each one written under a temporary name first so
+    # that readers never see a partial file
+    def save(self, directory, fingerprint):
+        prefix = os.path.join(directory, fingerprint)
+        for name in GRAPH_ARRAYS:
+            filename = prefix + '.' + name + '.npy'
+            with open(filename + '.tmp', 'wb') as stream:
+                numpy.save(stream, getattr(self, name))
+            os.rename(filename + '.tmp', filename)
+
+
+GRAPH_ARRAYS = ('indptr', 'indices', 'weights')
+
+
+# Finds the vertices at given points, several vertices possibly sharing one
+# point. The points are sorted as complex numbers, that is, by x then y.
+class VertexFinder(object):
+    def __init__(self, vertices):
+        keys = vertices[:, 0] + 1j * vertices[:, 1]
+        self.order = numpy.argsort(keys, kind='mergesort')
+        self.keys = keys[self.order]
+
+    # Indices of the vertices at the (m, 2) points
+    def find(self, points):
+        keys = points[:, 0] + 1j * points[:, 1]
+        first = numpy.searchsorted(self.keys, keys, side='left')
+        last = numpy.searchsorted(self.keys, keys, side='right')
+        counts = last - first
+        offsets = numpy.arange(counts.sum()) - \
+                  numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        return self.order[numpy.repeat(first, counts) + offsets]
+
+
+# Neighbours of vertex v, and the polar order of its view, which starts from
+# the events given
+def visible_vertices(scene, vertices, finder, v, events):
+    x, y = vertices[v]
+    at_source = finder.find(vertices[v:v + 1])
+    ending = numpy.unique(at_source // 2)
+    hidden = (scene.y0 < y) & (scene.y1 < y)
+    hidden[ending] = True
+
+    view = scene.view(x, y, events, hidden)
+    intervals = view_intervals(view)
+    points = numpy.column_stack((
+        numpy.concatenate((intervals.start_x, intervals.end_x)),
+        numpy.concatenate((intervals.start_y, intervals.end_y))))
+    seen = finder.find(points)
+    seen = numpy.concatenate((seen[vertices[seen, 1] >= y],
+                              2 * ending, 2 * ending + 1))
+    seen = numpy.unique(seen)
+    return seen[~numpy.in1d(seen, at_source)], view.order